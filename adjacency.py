@@ -0,0 +1,104 @@
+from array import array
+
+
+class Adjacency:
+    """Неизменяемое представление графа на целых индексах.
+
+    Метки вершин переводятся в номера 0..n-1 один раз, списки смежности хранятся
+    в формате CSR: соседи вершины v лежат в targets[offsets[v]:offsets[v + 1]]
+    в порядке возрастания номеров.
+    """
+
+    def __init__(self, labels, adjacency, directed):
+        self.directed = directed
+        self.labels = list(labels)
+        self.index = {label: i for i, label in enumerate(self.labels)}
+        n = len(self.labels)
+
+        self.offsets = array("l", [0]) * (n + 1)
+        self.targets = array("l")
+        for v, label in enumerate(self.labels):
+            self.targets.extend(sorted(self.index[u] for u in adjacency[label]))
+            self.offsets[v + 1] = len(self.targets)
+
+        self._bits = None
+        self._in_bits = None
+        self._edge_ids = None
+
+    @classmethod
+    def from_edges(cls, edges, directed, labels=()):
+        adjacency = {label: set() for label in labels}
+        for u, v in edges:
+            adjacency.setdefault(u, set()).add(v)
+            adjacency.setdefault(v, set())
+            if not directed:
+                adjacency[v].add(u)
+        return cls(adjacency.keys(), adjacency, directed)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def edge_count(self) -> int:
+        if self.directed:
+            return len(self.targets)
+        return len(self.targets) // 2
+
+    def neighbours(self, v):
+        return self.targets[self.offsets[v]:self.offsets[v + 1]]
+
+    def degree(self, v) -> int:
+        return self.offsets[v + 1] - self.offsets[v]
+
+    def in_degrees(self) -> array:
+        res = array("l", [0]) * len(self.labels)
+        for u in self.targets:
+            res[u] += 1
+        return res
+
+    @property
+    def bits(self) -> list:
+        if self._bits is None:
+            self._bits = []
+            for v in range(len(self.labels)):
+                mask = 0
+                for u in self.neighbours(v):
+                    mask |= 1 << u
+                self._bits.append(mask)
+        return self._bits
+
+    @property
+    def in_bits(self) -> list:
+        if not self.directed:
+            return self.bits
+        if self._in_bits is None:
+            self._in_bits = [0] * len(self.labels)
+            for v in range(len(self.labels)):
+                for u in self.neighbours(v):
+                    self._in_bits[u] |= 1 << v
+        return self._in_bits
+
+    @property
+    def edge_ids(self) -> array:
+        # номер ребра для каждой позиции targets: в неориентированном графе
+        # обе записи ребра (u, v) и (v, u) получают один номер
+        if self._edge_ids is None:
+            if self.directed:
+                self._edge_ids = array("l", range(len(self.targets)))
+            else:
+                self._edge_ids = array("l", [0]) * len(self.targets)
+                ids = dict()
+                for v in range(len(self.labels)):
+                    for i in range(self.offsets[v], self.offsets[v + 1]):
+                        u = self.targets[i]
+                        key = (u, v) if u < v else (v, u)
+                        if key not in ids:
+                            ids[key] = len(ids)
+                        self._edge_ids[i] = ids[key]
+        return self._edge_ids
+
+    def has_edge(self, u, v) -> bool:
+        return bool(self.bits[u] >> v & 1)
+
+    def label_edge(self, u, v) -> tuple:
+        return self.labels[u], self.labels[v]
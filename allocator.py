@@ -0,0 +1,41 @@
+import heapq
+
+
+class NumberAllocator:
+    """Выдаёт наименьший свободный номер вершины, как mex, но без сортировки всех номеров.
+
+    Номера меньше next либо заняты, либо лежат в куче free; в куче могут
+    остаться номера, занятые позже через reserve, они пропускаются при выдаче.
+    """
+
+    def __init__(self, start=1):
+        self.start = start
+        self.next = start
+        self.free = []
+        self.used = set()
+
+    def allocate(self) -> int:
+        while self.free:
+            number = heapq.heappop(self.free)
+            if number not in self.used:
+                self.used.add(number)
+                return number
+        while self.next in self.used:
+            self.next += 1
+        number = self.next
+        self.next += 1
+        self.used.add(number)
+        return number
+
+    def reserve(self, number):
+        self.used.add(number)
+
+    def release(self, number):
+        if number not in self.used:
+            return
+        self.used.remove(number)
+        if number < self.next:
+            heapq.heappush(self.free, number)
+
+    def reset(self):
+        self.__init__(self.start)
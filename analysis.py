@@ -0,0 +1,131 @@
+"""Проверки за O(V + E), по которым гамильтонов путь или цикл заведомо не существует.
+
+Функции возвращают причину (строку для сообщения в редакторе) или None, если перебор всё-таки нужен.
+Ориентированный граф проверяется по степеням и связности, а двудольность и
+точки сочленения -- по его неориентированной основе.
+"""
+
+
+def _undirected(core) -> list:
+    if not core.directed:
+        return [core.neighbours(v) for v in range(len(core))]
+    adj = [set(core.neighbours(v)) for v in range(len(core))]
+    for v in range(len(core)):
+        for u in core.neighbours(v):
+            adj[u].add(v)
+    return [list(a) for a in adj]
+
+
+def _reached(adj, start) -> bytearray:
+    seen = bytearray(len(adj))
+    seen[start] = 1
+    stack = [start]
+    while stack:
+        v = stack.pop()
+        for u in adj[v]:
+            if not seen[u]:
+                seen[u] = 1
+                stack.append(u)
+    return seen
+
+
+def _sides(adj):
+    # размеры долей, если граф двудольный, иначе None
+    color = [-1] * len(adj)
+    color[0] = 0
+    stack = [0]
+    while stack:
+        v = stack.pop()
+        for u in adj[v]:
+            if color[u] < 0:
+                color[u] = 1 - color[v]
+                stack.append(u)
+            elif color[u] == color[v]:
+                return None
+    black = sum(color)
+    return len(adj) - black, black
+
+
+def cut_pieces(adj) -> list:
+    """Для каждой вершины -- число компонент, на которые её удаление делит граф.
+
+    Итеративный Тарьян по времени входа и low; граф должен быть связным.
+    """
+    n = len(adj)
+    tin = [-1] * n
+    low = [0] * n
+    pieces = [1] * n
+    tin[0] = low[0] = 0
+    pieces[0] = 0
+    timer = 1
+    stack = [(0, -1, iter(adj[0]))]
+    while stack:
+        v, parent, it = stack[-1]
+        u = next(it, None)
+        if u is None:
+            stack.pop()
+            if parent >= 0:
+                low[parent] = min(low[parent], low[v])
+                if low[v] >= tin[parent]:
+                    pieces[parent] += 1
+            continue
+        if u == parent:
+            continue
+        if tin[u] >= 0:
+            low[v] = min(low[v], tin[u])
+            continue
+        tin[u] = low[u] = timer
+        timer += 1
+        stack.append((u, v, iter(adj[u])))
+    return pieces
+
+
+def _directed_obstacle(core, cycle):
+    n = len(core)
+    in_degrees = core.in_degrees()
+    sources = sum(1 for v in range(n) if not in_degrees[v])
+    sinks = sum(1 for v in range(n) if not core.degree(v))
+    if cycle and (sources or sinks):
+        return "у вершины нет входящих или исходящих дуг"
+    if sources > 1 or sinks > 1:
+        return "больше одной вершины без входящих или без исходящих дуг"
+    if cycle:
+        # сильная связность: все вершины достижимы из 0 по дугам и против них
+        reverse = [[] for _ in range(n)]
+        for v in range(n):
+            for u in core.neighbours(v):
+                reverse[u].append(v)
+        forward = [core.neighbours(v) for v in range(n)]
+        if not all(_reached(forward, 0)) or not all(_reached(reverse, 0)):
+            return "граф не сильно связен"
+    return None
+
+
+def hamilton_obstacle(core, cycle=False):
+    n = len(core)
+    if n < 2:
+        return None if n and not cycle else "слишком мало вершин"
+    adj = _undirected(core)
+    if not all(_reached(adj, 0)):
+        return "граф несвязен"
+    if core.directed:
+        reason = _directed_obstacle(core, cycle)
+        if reason is not None:
+            return reason
+    else:
+        degrees = [len(a) for a in adj]
+        # как и в hamilton_cycle, одно ребро из двух вершин считается циклом
+        if cycle and min(degrees) < (1 if n == 2 else 2):
+            return "есть вершина степени меньше 2"
+        if not cycle and sum(1 for d in degrees if d == 1) > 2:
+            return "больше двух вершин степени 1"
+    sides = _sides(adj)
+    if sides is not None and abs(sides[0] - sides[1]) > (0 if cycle else 1):
+        return f"двудольный граф с неравными долями {sides[0]} и {sides[1]}"
+    if n > 2:
+        # путь через вершину делится ею не больше чем на две части, цикл -- на одну;
+        # мост при n > 2 всегда даёт точку сочленения
+        pieces = cut_pieces(adj)
+        if max(pieces) > (1 if cycle else 2):
+            return "есть точка сочленения" if cycle else "вершина делит граф больше чем на две части"
+    return None
@@ -0,0 +1,150 @@
+"""Силовая укладка графа (Фрюхтерман -- Рейнгольд) с отталкиванием по Барнсу -- Хату.
+
+Квадродерево строится неявно: уровень L -- сетка 2^L x 2^L над квадратом,
+покрывающим все вершины, масса и центр масс клеток считаются bincount'ом.
+Вершина отталкивается от клеток уровня L, которые лежат в соседях клетки
+родителя, но не в соседях её собственной клетки (как в списке взаимодействий
+метода мультиполей), а на нижнем уровне -- точно от вершин соседних клеток.
+Каждая пара вершин учитывается ровно один раз, всё считается векторно по всем
+вершинам, поэтому шаг стоит O(n log n) операций numpy.
+"""
+import functools
+import math
+
+import numpy as np
+
+POINTS_PER_CELL = 4
+MAX_LEVEL = 10
+
+
+class ForceLayout:
+    """Пошаговая укладка: step() делает одну итерацию, done -- когда остыла."""
+
+    def __init__(self, positions, edges, spacing=120, iterations=200, seed=0):
+        rng = np.random.default_rng(seed)
+        self.positions = np.array(positions, dtype=float).reshape(-1, 2)
+        n = len(self.positions)
+        # совпадающие вершины не разойдутся, поэтому начальное положение слегка шевелится
+        self.positions += rng.uniform(-1, 1, self.positions.shape)
+        self.edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        self.k = spacing
+        self.iterations = iterations
+        self.iteration = 0
+        # как у Фрюхтермана -- Рейнгольда, вершины держатся в рамке площадью n * spacing^2
+        side = spacing * math.sqrt(max(n, 1))
+        middle = self.positions.mean(axis=0) if n else np.zeros(2)
+        self.frame = (middle - side / 2, middle + side / 2)
+        self.temperature = side / 10
+        self._cooling = self.temperature / max(iterations, 1)
+
+    @property
+    def done(self) -> bool:
+        return self.iteration >= self.iterations or len(self.positions) < 2
+
+    def step(self):
+        pos = self.positions
+        disp = repulsion(pos, self.k)
+        if len(self.edges):
+            u, v = self.edges[:, 0], self.edges[:, 1]
+            delta = pos[u] - pos[v]
+            dist = np.hypot(delta[:, 0], delta[:, 1])[:, None]
+            force = delta * dist / self.k
+            n = len(pos)
+            for axis in range(2):
+                disp[:, axis] -= np.bincount(u, force[:, axis], minlength=n)
+                disp[:, axis] += np.bincount(v, force[:, axis], minlength=n)
+        length = np.hypot(disp[:, 0], disp[:, 1])[:, None]
+        pos += disp / np.maximum(length, 1e-9) * np.minimum(length, self.temperature)
+        np.clip(pos, *self.frame, out=pos)
+        self.temperature = max(self.temperature - self._cooling, 1)
+        self.iteration += 1
+
+
+def _cells(pos, origin, size, level) -> tuple:
+    side = 1 << level
+    cell = ((pos - origin) / size * side).astype(np.int64)
+    np.clip(cell, 0, side - 1, out=cell)
+    return cell[:, 0], cell[:, 1]
+
+
+def _level_masses(pos, origin, size, level) -> tuple:
+    side = 1 << level
+    cx, cy = _cells(pos, origin, size, level)
+    cell = cy * side + cx
+    mass = np.bincount(cell, minlength=side * side).astype(float)
+    weight = np.maximum(mass, 1)
+    center_x = np.bincount(cell, pos[:, 0], side * side) / weight
+    center_y = np.bincount(cell, pos[:, 1], side * side) / weight
+    return cx, cy, mass, center_x, center_y
+
+
+@functools.lru_cache(maxsize=MAX_LEVEL + 1)
+def interaction_cells(level) -> np.ndarray:
+    """Для каждой клетки уровня -- 27 клеток, от которых вершины клетки отталкиваются.
+
+    Это дети соседей родительской клетки, не соседние с самой клеткой; у краёв
+    строки дополнены номером side * side (пустая клетка), номер клетки -- y * side + x.
+    """
+    side = 1 << level
+    cy, cx = np.divmod(np.arange(side * side), side)
+    a, b = np.meshgrid(np.arange(-2, 4), np.arange(-2, 4))
+    x = 2 * (cx // 2)[:, None] + a.ravel()
+    y = 2 * (cy // 2)[:, None] + b.ravel()
+    far = ((np.abs(x - cx[:, None]) > 1) | (np.abs(y - cy[:, None]) > 1)) & (x >= 0) & (x < side) \
+        & (y >= 0) & (y < side)
+    # в строке не больше 27 настоящих клеток, пустые после сортировки уходят в конец
+    return np.sort(np.where(far, y * side + x, side * side), axis=1)[:, :27]
+
+
+def repulsion(pos, k) -> np.ndarray:
+    n = len(pos)
+    disp = np.zeros_like(pos)
+    if n < 2:
+        return disp
+    k2 = k * k
+    origin = pos.min(axis=0)
+    size = max(float((pos.max(axis=0) - origin).max()), 1.0) * (1 + 1e-9)
+    finest = min(MAX_LEVEL, max(2, math.ceil(math.log(max(n / POINTS_PER_CELL, 1), 4))))
+
+    for level in range(2, finest + 1):
+        cx, cy, mass, center_x, center_y = _level_masses(pos, origin, size, level)
+        # несуществующие клетки списка указывают на последнюю, пустую клетку
+        mass = np.append(mass, 0)
+        cell = interaction_cells(level)[cy * (1 << level) + cx]
+        # координаты по отдельности: свёртка по короткой оси (x, y) в numpy медленная
+        dx = pos[:, 0, None] - np.append(center_x, 0)[cell]
+        dy = pos[:, 1, None] - np.append(center_y, 0)[cell]
+        force = mass[cell] * k2 / np.maximum(dx * dx + dy * dy, 1e-2)
+        disp[:, 0] += (dx * force).sum(axis=1)
+        disp[:, 1] += (dy * force).sum(axis=1)
+
+    # нижний уровень: точно по парам вершин из соседних клеток
+    side = 1 << finest
+    cx, cy = _cells(pos, origin, size, finest)
+    cell = cy * side + cx
+    order = np.argsort(cell, kind="stable")
+    counts = np.bincount(cell, minlength=side * side)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    points = np.arange(n)
+    for a in (-1, 0, 1):
+        for b in (-1, 0, 1):
+            x, y = cx + a, cy + b
+            ok = (x >= 0) & (x < side) & (y >= 0) & (y < side)
+            i = points[ok]
+            other = (y[ok] * side + x[ok])
+            cnt = counts[other]
+            total = int(cnt.sum())
+            if not total:
+                continue
+            ii = np.repeat(i, cnt)
+            first = np.repeat(starts[other], cnt)
+            within = np.arange(total) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            jj = order[first + within]
+            keep = ii != jj
+            ii, jj = ii[keep], jj[keep]
+            dx = pos[ii, 0] - pos[jj, 0]
+            dy = pos[ii, 1] - pos[jj, 1]
+            force = k2 / np.maximum(dx * dx + dy * dy, 1e-2)
+            disp[:, 0] += np.bincount(ii, dx * force, minlength=n)
+            disp[:, 1] += np.bincount(ii, dy * force, minlength=n)
+    return disp
@@ -0,0 +1,190 @@
+"""Пакетный запуск алгоритмов без окна pygame.
+
+Графы читаются из файлов со списком рёбер (одна пара вершин в строке, один граф
+на файл) или из JSONL ({"id": ..., "directed": ..., "nodes": [...],
+"edges": [[u, v], ...]} в каждой строке), результаты выводятся в JSONL.
+Непрочитанный файл, строка не в JSON или граф не того вида дают одну запись
+{"id": ..., "error": ...}, и запуск продолжается со следующего графа.
+
+    python batch.py graphs.jsonl -a hamilton_path -a euler --workers 8 --steps
+    python batch.py big.txt -a all_hamilton_cycles --workers 1 --split 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from cache import ResultCache
+from graph import Graph
+from states import ResultTrace, Trace
+
+ALGORITHMS = ("euler", "hamilton_cycle", "hamilton_path")
+# подсчёт и перечисление всех путей запускаются только по явному -a
+COUNTING = ("count_hamilton_cycles", "count_hamilton_paths", "all_hamilton_cycles", "all_hamilton_paths")
+
+_caches = dict()
+
+
+def read_edge_list(path, directed) -> dict:
+    edges = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].split()
+                if len(line) >= 2:
+                    edges.append(line[:2])
+    except (OSError, UnicodeDecodeError) as e:
+        return {"id": path, "error": f"cannot read file: {e}"}
+    return {"id": path, "directed": directed, "edges": edges}
+
+
+def read_jsonl(f, name, directed):
+    # испорченная строка становится записью с полем error, а не обрывает весь поток
+    for i, line in enumerate(f):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield {"id": f"{name}:{i + 1}", "error": f"invalid JSON: {e}"}
+            continue
+        if not isinstance(item, dict):
+            yield {"id": f"{name}:{i + 1}", "error": "record is not a JSON object"}
+            continue
+        item.setdefault("id", f"{name}:{i + 1}")
+        item.setdefault("directed", directed)
+        yield item
+
+
+def read_graphs(paths, directed):
+    if not paths:
+        yield from read_jsonl(sys.stdin, "<stdin>", directed)
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                yield from read_jsonl(f, path, directed)
+        else:
+            yield read_edge_list(path, directed)
+
+
+def get_cache(path) -> ResultCache:
+    # свой кэш в каждом процессе пула, общий между ними только файл на диске
+    if path not in _caches:
+        _caches[path] = ResultCache(path=path)
+    return _caches[path]
+
+
+def build_graph(item, cache=None) -> Graph:
+    directed = bool(item.get("directed", False))
+    graph = Graph(directed, cache)
+    for node in item.get("nodes", ()):
+        graph.add_node(str(node))
+    for u, v in item["edges"]:
+        graph.add_edge(str(u), str(v), directed)
+    return graph
+
+
+def solve(graph, algorithm, record=False):
+    # шаги нужны только для --steps, иначе решатели их не записывают
+    trace = Trace() if record else ResultTrace()
+    if algorithm == "euler":
+        if not graph.check_euler_path():
+            return None
+        return graph.find_euler_path(trace=trace)
+    elif algorithm == "hamilton_cycle":
+        return graph.hamilton_cycle(trace=trace)
+    elif algorithm == "hamilton_path":
+        return graph.hamilton_path(trace=trace)
+    raise ValueError(f"unknown algorithm: {algorithm}")
+
+
+def count(graph, algorithm, split) -> dict:
+    if algorithm.startswith("count_"):
+        return {"count": getattr(graph, algorithm)(split)}
+    paths = list(getattr(graph, algorithm)(split))
+    return {"count": len(paths), "paths": paths}
+
+
+def run_item(args) -> list:
+    item, algorithms, with_steps, split, cache_path = args
+    if "error" in item:
+        return [{"id": item["id"], "error": item["error"]}]
+    try:
+        graph = build_graph(item, get_cache(cache_path))
+    except KeyError as e:
+        return [{"id": item["id"], "error": f"invalid graph: missing field {e}"}]
+    except (TypeError, ValueError) as e:
+        return [{"id": item["id"], "error": f"invalid graph: {e}"}]
+    res = []
+    for algorithm in algorithms:
+        record = {"id": item["id"], "algorithm": algorithm}
+        start_time = time.perf_counter()
+        if algorithm in COUNTING:
+            try:
+                record.update(count(graph, algorithm, split))
+            except ValueError as e:
+                record["error"] = str(e)
+                res.append(record)
+                continue
+            record["time"] = time.perf_counter() - start_time
+            res.append(record)
+            continue
+        try:
+            states = solve(graph, algorithm, with_steps)
+        except ValueError as e:
+            record["error"] = str(e)
+            res.append(record)
+            continue
+        record["time"] = time.perf_counter() - start_time
+        path = states[-1]["green_nodes"] if states else []
+        record["exists"] = bool(path)
+        if states is not None and states.reason is not None:
+            record["reason"] = states.reason
+        record["path"] = path
+        if with_steps:
+            record["steps"] = len(states) if states else 0
+        res.append(record)
+    return res
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch solver for graph files")
+    parser.add_argument("files", nargs="*", help="edge-list files or .jsonl files (stdin JSONL if omitted)")
+    parser.add_argument("-a", "--algorithm", action="append", choices=ALGORITHMS + COUNTING,
+                        help="algorithm to run, can be repeated (default: all)")
+    parser.add_argument("-d", "--directed", action="store_true", help="treat edge lists as directed")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=4, help="graphs sent to a worker at once")
+    parser.add_argument("--split", type=int, default=1,
+                        help="processes per graph for counting and enumerating Hamiltonian paths (needs --workers 1)")
+    parser.add_argument("--cache", help="SQLite file that keeps results between runs")
+    parser.add_argument("--steps", action="store_true", help="report the number of recorded steps")
+    parser.add_argument("-o", "--output", help="output JSONL file (default: stdout)")
+    args = parser.parse_args(argv)
+    # процессы пула не могут запускать свои пулы
+    if args.split > 1 and args.workers > 1:
+        parser.error("--split needs --workers 1")
+
+    algorithms = tuple(args.algorithm or ALGORITHMS)
+    tasks = ((item, algorithms, args.steps, args.split, args.cache) for item in read_graphs(args.files, args.directed))
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    pool = multiprocessing.Pool(args.workers) if args.workers > 1 else None
+    try:
+        results = pool.imap(run_item, tasks, chunksize=args.chunksize) if pool else map(run_item, tasks)
+        for records in results:
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
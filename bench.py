@@ -0,0 +1,143 @@
+"""Замеры алгоритмов Graph на сгенерированных семействах графов.
+
+    python bench.py                 # сравнить с bench_baseline.json
+    python bench.py --update        # перезаписать эталон
+    python bench.py --quick -k grid # только маленькие графы семейства grid
+
+Для каждого случая измеряются время (минимум из нескольких запусков на свежем
+графе), пиковая память через tracemalloc и число шагов в трассе. Случай считается
+регрессией, если время или память выросли больше допуска относительно эталона
+или изменилось число шагов. К допуску по времени добавляется разброс самих
+замеров (медиана минус минимум), так что шумный случай не даёт ложной регрессии.
+Эталон перезаписывается (--update) в том же коммите, что меняет измеряемый алгоритм.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import generators
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# (семейство, размер, фабрика графа, методы)
+EULER = ("check_euler_path", "find_euler_path")
+HAMILTON = ("hamilton_cycle", "hamilton_path")
+
+
+def cases(quick=False) -> list:
+    small = (6, 10) if quick else (6, 10, 14, 18)
+    large = (100, 1000) if quick else (100, 1000, 10000)
+    res = []
+    for n in small:
+        res.append(("complete", n, lambda n=n: generators.complete(n), EULER + HAMILTON))
+        res.append(("gnp-0.3", n, lambda n=n: generators.gnp(n, 0.3, seed=n), EULER + HAMILTON))
+        res.append(("bipartite-k-k+1", n, lambda n=n: generators.complete_bipartite(n // 2, n // 2 + 1), HAMILTON))
+        res.append(("bipartite-k-k+2", n, lambda n=n: generators.complete_bipartite(n // 2, n // 2 + 2), HAMILTON))
+    for n in large:
+        res.append(("cycle", n, lambda n=n: generators.cycle(n), EULER + ("hamilton_cycle",)))
+        res.append(("eulerian", n, lambda n=n: generators.eulerian(n, extra_cycles=20, seed=n), EULER))
+        side = int(n ** 0.5)
+        res.append(("grid", side * side, lambda side=side: generators.grid(side, side), EULER))
+        res.append(("gnp-sparse", n, lambda n=n: generators.gnp(n, 4 / n, seed=n), EULER))
+    return res
+
+
+def _run(factory, method):
+    graph = factory()
+    # как в timeit: сборщик мусора не должен попадать в замер
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = getattr(graph, method)()
+        return time.perf_counter() - start, result
+    finally:
+        gc.enable()
+
+
+def measure(factory, method, repeat) -> dict:
+    times = []
+    result = None
+    for _ in range(repeat):
+        elapsed, result = _run(factory, method)
+        times.append(elapsed)
+    graph = factory()
+    tracemalloc.start()
+    getattr(graph, method)()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times.sort()
+    return {"time": times[0], "noise": times[len(times) // 2] - times[0], "peak_memory": peak,
+            "trace_size": len(result) if hasattr(result, "__len__") else None}
+
+
+def compare(current, baseline, time_tolerance, memory_tolerance, min_time) -> list:
+    regressions = []
+    for key, res in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        noise = res.get("noise", 0) + base.get("noise", 0)
+        if (res["time"] > base["time"] * (1 + time_tolerance) + noise
+                and res["time"] - base["time"] > max(min_time, noise)):
+            regressions.append(f"{key}: time {base['time'] * 1000:.3f} -> {res['time'] * 1000:.3f} ms")
+        if res["peak_memory"] > base["peak_memory"] * (1 + memory_tolerance):
+            regressions.append(f"{key}: peak memory {base['peak_memory']} -> {res['peak_memory']} B")
+        # число шагов не зависит от машины: любое изменение -- повод обновить эталон
+        if res["trace_size"] != base.get("trace_size"):
+            regressions.append(f"{key}: trace size {base.get('trace_size')} -> {res['trace_size']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Graph algorithms on generated graph families")
+    parser.add_argument("--quick", action="store_true", help="only small sizes")
+    parser.add_argument("-k", "--filter", default="", help="run only cases whose name contains this text")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON file")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed relative memory growth")
+    parser.add_argument("--min-time", type=float, default=0.001, help="ignore slowdowns smaller than this (s)")
+    args = parser.parse_args(argv)
+
+    current = dict()
+    print(f"{'case':<42}{'time, ms':>12}{'peak, KiB':>12}{'steps':>10}")
+    for family, size, factory, methods in cases(args.quick):
+        for method in methods:
+            key = f"{family}/{size}/{method}"
+            if args.filter not in key:
+                continue
+            res = measure(factory, method, args.repeat)
+            current[key] = res
+            print(f"{key:<42}{res['time'] * 1000:>12.3f}{res['peak_memory'] / 1024:>12.1f}"
+                  f"{res['trace_size'] if res['trace_size'] is not None else '-':>10}")
+
+    if args.update:
+        baseline = dict()
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(current)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline, run with --update to create one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.time_tolerance, args.memory_tolerance, args.min_time)
+    for line in regressions:
+        print("REGRESSION", line)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
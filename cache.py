@@ -0,0 +1,162 @@
+"""Кэш результатов решателей по канонической форме графа.
+
+Вершины упорядочиваются уточнением раскраски (Вейсфейлер -- Леман): цвет
+вершины уточняется мультимножеством цветов соседей, пока разбиение меняется;
+если классы остаются неодноэлементными, одна вершина наименьшего такого класса
+получает свой цвет, и уточнение повторяется. Каноническая форма -- список рёбер
+в новых номерах. Выбор вершины в классе зависит от исходной нумерации, поэтому
+у изоморфных графов формы изредка различаются (это только промах кэша), но
+совпавшие формы всегда дают изоморфизм, по которому переводится результат.
+
+Результаты хранятся в номерах канонического порядка: поиск пути -- словарь
+с путём (списком номеров) и причиной отсутствия, счётчик -- число. В памяти держится не больше max_size последних форм, при
+заданном path они также пишутся в SQLite и переживают перезапуск.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# для больших графов построение формы дороже перебора, который она экономит
+MAX_NODES = 32
+
+
+def user_cache_path(name="results.sqlite"):
+    """Файл в каталоге кэша пользователя или None, если каталог не создать."""
+    base = (os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    directory = os.path.join(base, "dmgraph")
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return None
+    return os.path.join(directory, name)
+
+
+def _refine(core, preds, colors) -> list:
+    n = len(core)
+    classes = len(set(colors))
+    while True:
+        sigs = [(colors[v], tuple(sorted(colors[u] for u in core.neighbours(v))),
+                 tuple(sorted(colors[u] for u in preds[v])) if preds else ()) for v in range(n)]
+        ranks = {sig: i for i, sig in enumerate(sorted(set(sigs)))}
+        colors = [ranks[sig] for sig in sigs]
+        # новое разбиение мельче старого, одинаковое число классов -- устойчивость
+        if len(ranks) == classes:
+            return colors
+        classes = len(ranks)
+
+
+def canonical_order(core) -> list:
+    n = len(core)
+    preds = None
+    if core.directed:
+        preds = [[] for _ in range(n)]
+        for v in range(n):
+            for u in core.neighbours(v):
+                preds[u].append(v)
+    colors = _refine(core, preds, [0] * n)
+    while len(set(colors)) < n:
+        sizes = dict()
+        for c in colors:
+            sizes[c] = sizes.get(c, 0) + 1
+        c = min(c for c, size in sizes.items() if size > 1)
+        v = colors.index(c)
+        colors = [2 * color for color in colors]
+        colors[v] += 1
+        colors = _refine(core, preds, colors)
+    return sorted(range(n), key=colors.__getitem__)
+
+
+def canonical_form(name, core, order) -> tuple:
+    pos = [0] * len(core)
+    for i, v in enumerate(order):
+        pos[v] = i
+    edges = sorted((pos[v], pos[u]) for v in range(len(core)) for u in core.neighbours(v)
+                   if core.directed or pos[v] < pos[u])
+    return name, core.directed, len(core), tuple(edges)
+
+
+class ResultCache:
+    """LRU-кэш результатов с необязательным хранилищем на диске."""
+
+    def __init__(self, max_size=256, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            # решатель работает в фоновом потоке, соединение общее под блокировкой
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, form TEXT, value TEXT)")
+            self._db.commit()
+
+    @staticmethod
+    def key(name, core):
+        """Пара (каноническая форма, порядок вершин) или None для больших графов."""
+        if len(core) > MAX_NODES:
+            return None
+        order = canonical_order(core)
+        return canonical_form(name, core, order), order
+
+    @staticmethod
+    def _digest(form) -> tuple:
+        text = json.dumps(form)
+        return hashlib.sha256(text.encode()).hexdigest(), text
+
+    def get(self, form):
+        with self._lock:
+            if form in self._items:
+                self._items.move_to_end(form)
+                self.hits += 1
+                return self._items[form]
+            value = self._load(form)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(form, value)
+            return value
+
+    def put(self, form, value):
+        with self._lock:
+            self._remember(form, value)
+            if self._db is not None:
+                digest, text = self._digest(form)
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                                     (digest, text, json.dumps(value)))
+                    self._db.commit()
+                except sqlite3.Error:
+                    # занятая другим процессом база -- только промах в следующий раз
+                    pass
+
+    def _remember(self, form, value):
+        self._items[form] = value
+        self._items.move_to_end(form)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def _load(self, form):
+        if self._db is None:
+            return None
+        digest, text = self._digest(form)
+        try:
+            row = self._db.execute("SELECT form, value FROM results WHERE key = ?", (digest,)).fetchone()
+        except sqlite3.Error:
+            return None
+        # совпадение хэша подтверждается сравнением самих форм
+        if row is None or row[0] != text:
+            return None
+        return json.loads(row[1])
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,70 @@
+import math
+
+import pygame as pg
+
+
+class Camera:
+    """Масштаб и сдвиг холста: экранная точка = (точка холста - offset) * zoom.
+
+    Спрайты, пространственный индекс и модель живут в координатах холста,
+    камера нужна только при рисовании и при переводе положения мыши.
+    """
+
+    MIN_ZOOM = 0.05
+    MAX_ZOOM = 4
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.offset = pg.Vector2(0, 0)
+        self.zoom = 1.0
+
+    def reset(self):
+        self.offset = pg.Vector2(0, 0)
+        self.zoom = 1.0
+
+    def to_world(self, pos) -> pg.Vector2:
+        return pg.Vector2(pos) / self.zoom + self.offset
+
+    def to_screen(self, pos) -> tuple:
+        return (pos[0] - self.offset.x) * self.zoom, (pos[1] - self.offset.y) * self.zoom
+
+    def screen_rect(self, rect) -> pg.Rect:
+        if self.zoom == 1:
+            return rect.move(-round(self.offset.x), -round(self.offset.y))
+        left, top = self.to_screen(rect.topleft)
+        right, bottom = self.to_screen(rect.bottomright)
+        left, top = math.floor(left), math.floor(top)
+        return pg.Rect(left, top, math.ceil(right) - left, math.ceil(bottom) - top)
+
+    @property
+    def world_rect(self) -> pg.Rect:
+        left, top = self.offset
+        return pg.Rect(math.floor(left), math.floor(top), math.ceil(self.width / self.zoom) + 1,
+                       math.ceil(self.height / self.zoom) + 1)
+
+    def pan(self, dx, dy):
+        self.offset -= pg.Vector2(dx, dy) / self.zoom
+        if self.zoom == 1:
+            # при масштабе 1 спрайты рисуются без пересчёта, сдвиг держится целым
+            self.offset = pg.Vector2(round(self.offset.x), round(self.offset.y))
+
+    def _set_zoom(self, zoom, pos, world):
+        # точка холста world оказывается на экране в pos; около 1 масштаб прилипает
+        # к 1, чтобы снова рисовать спрайты без масштабирования
+        zoom = min(self.MAX_ZOOM, max(self.MIN_ZOOM, zoom))
+        if abs(zoom - 1) < 0.04:
+            zoom = 1.0
+        self.zoom = zoom
+        self.offset = pg.Vector2(world) - pg.Vector2(pos) / zoom
+        if zoom == 1:
+            self.offset = pg.Vector2(round(self.offset.x), round(self.offset.y))
+
+    def zoom_at(self, pos, factor):
+        # точка холста под курсором остаётся под курсором
+        self._set_zoom(self.zoom * factor, pos, self.to_world(pos))
+
+    def fit(self, rect, width, height):
+        # rect холста целиком помещается в левый верхний угол экрана width x height
+        zoom = min(width / max(rect.width, 1), height / max(rect.height, 1), 1)
+        self._set_zoom(zoom, (width / 2, height / 2), rect.center)
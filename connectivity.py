@@ -0,0 +1,34 @@
+from array import array
+
+
+class DisjointSet:
+
+    def __init__(self, n):
+        self.parent = array("l", range(n))
+        self.size = array("l", [1]) * n
+        self.count = n
+
+    def add(self) -> int:
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        self.count += 1
+        return len(self.parent) - 1
+
+    def find(self, v) -> int:
+        parent = self.parent
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    def union(self, u, v) -> bool:
+        u, v = self.find(u), self.find(v)
+        if u == v:
+            return False
+        if self.size[u] < self.size[v]:
+            u, v = v, u
+        self.parent[v] = u
+        self.size[u] += self.size[v]
+        self.count -= 1
+        return True
+
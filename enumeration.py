@@ -0,0 +1,103 @@
+"""Подсчёт и перечисление всех гамильтоновых путей и циклов.
+
+Дерево перебора делится на поддеревья по началу пути и первым ветвлениям
+(префиксам), поддеревья обходятся в пуле процессов, а их результаты приходят
+по мере готовности. Префиксы дробятся, пока их не станет TASKS_PER_WORKER на
+процесс, чтобы неравные по размеру поддеревья распределялись между процессами.
+
+В неориентированном графе путь и его разворот считаются одним путём, цикл
+задаётся множеством рёбер: начало цикла -- вершина 0, направление обхода одно.
+"""
+import multiprocessing
+
+import analysis
+import hamilton
+from progress import Progress
+
+TASKS_PER_WORKER = 16
+
+_bits = None
+_in_bits = None
+
+
+def _init(bits, in_bits):
+    # таблицы смежности передаются процессу один раз, а не с каждой задачей
+    global _bits, _in_bits
+    _bits = bits
+    _in_bits = in_bits
+
+
+def _search(args):
+    prefix, cycle, unique, count = args
+    paths = hamilton.extend_paths(_bits, _in_bits, prefix, cycle, unique)
+    if count:
+        return sum(1 for _ in paths)
+    return list(paths)
+
+
+def prefixes(core, cycle, parts) -> list:
+    n = len(core)
+    level = [[0]] if cycle else [[v] for v in range(n)]
+    bits = core.bits
+    # последняя вершина пути не дробится: такие задачи ничего не ищут
+    while len(level) < parts and len(level[0]) < n - 1:
+        nxt = []
+        for prefix in level:
+            visited = sum(1 << v for v in prefix)
+            rest = bits[prefix[-1]] & ~visited
+            while rest:
+                low = rest & -rest
+                nxt.append(prefix + [low.bit_length() - 1])
+                rest ^= low
+        if not nxt:
+            return []
+        level = nxt
+    return level
+
+
+def _results(core, cycle, count, workers, progress):
+    n = len(core)
+    if n == 0 or cycle and n < 2 or analysis.hamilton_obstacle(core, cycle) is not None:
+        return
+    progress = progress or Progress()
+    unique = not core.directed
+    tasks = [(prefix, cycle, unique, count)
+             for prefix in prefixes(core, cycle, max(1, workers) * TASKS_PER_WORKER)]
+    if workers <= 1:
+        _init(core.bits, core.in_bits)
+        for task in tasks:
+            progress.advance(steps=1)
+            yield _search(task)
+        return
+    with multiprocessing.Pool(workers, _init, (core.bits, core.in_bits)) as pool:
+        for res in pool.imap_unordered(_search, tasks):
+            # отмена завершает пул вместе с незаконченными задачами
+            progress.advance(steps=1)
+            yield res
+
+
+def iter_all(core, cycle=False, workers=1, progress=None):
+    """Отдаёт все гамильтоновы пути (циклы) как списки меток вершин.
+
+    Порядок путей не определён: они приходят из процессов по мере готовности.
+    """
+    labels = core.labels
+    for paths in _results(core, cycle, False, workers, progress):
+        for path in paths:
+            yield [labels[v] for v in path]
+
+
+def count_all(core, cycle=False, workers=1, progress=None) -> int:
+    """Число гамильтоновых путей (циклов).
+
+    Графы до MAX_COUNT_NODES вершин считаются динамикой по подмножествам в
+    одном процессе, большие -- параллельным перебором.
+    """
+    n = len(core)
+    if analysis.hamilton_obstacle(core, cycle) is not None:
+        return 0
+    dp = hamilton.count_cycles if cycle else hamilton.count_paths
+    limit = hamilton.MAX_COUNT_NODES + (1 if cycle else 0)
+    if n <= limit:
+        return dp(core, progress or Progress())
+    return sum(_results(core, cycle, True, workers, progress))
@@ -0,0 +1,67 @@
+def _start(core) -> int:
+    # начало пути: вершина с нечётной степенью, в ориентированном графе -- с
+    # исходящей степенью на единицу больше входящей, иначе любая с рёбрами
+    n = len(core)
+    if core.directed:
+        in_degrees = core.in_degrees()
+        for v in range(n):
+            if core.degree(v) - in_degrees[v] == 1:
+                return v
+    else:
+        for v in range(n):
+            if core.degree(v) % 2:
+                return v
+    for v in range(n):
+        if core.degree(v):
+            return v
+
+
+def euler_path(core, trace, progress):
+    """Алгоритм Хирхольцера за O(V + E).
+
+    Граф не меняется: для каждой вершины хранится указатель на первое ещё не
+    просмотренное ребро в CSR, пройденные рёбра отмечаются по номеру, так что
+    обратная запись неориентированного ребра пропускается при встрече.
+    """
+    if not len(core.targets):
+        return trace
+
+    labels = core.labels
+    targets = core.targets
+    ends = core.offsets[1:]
+    cursor = core.offsets[:-1]
+    edge_ids = core.edge_ids
+    used = bytearray(core.edge_count)
+    record = trace.recording
+    stack = [_start(core)]
+    res = []
+    while stack:
+        progress.advance(steps=1)
+        w = stack[-1]
+        if record:
+            trace.add("yellow_nodes", labels[w])
+        i = cursor[w]
+        while i < ends[w] and used[edge_ids[i]]:
+            i += 1
+        if i < ends[w]:
+            cursor[w] = i + 1
+            used[edge_ids[i]] = 1
+            u = targets[i]
+            if record:
+                trace.add("red_nodes", labels[u])
+                trace.add("red_edges", (labels[w], labels[u]))
+            stack.append(u)
+        else:
+            cursor[w] = i
+            p = stack.pop()
+            if record:
+                if res:
+                    trace.add("green_edges", (labels[res[-1]], labels[p]))
+                trace.appendleft_path(labels[p])
+            res.append(p)
+        if record:
+            trace.commit()
+
+    if not record:
+        trace.result(labels[v] for v in reversed(res))
+    return trace
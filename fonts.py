@@ -0,0 +1,8 @@
+import functools
+
+import pygame as pg
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(size, name="arial") -> pg.font.Font:
+    return pg.font.SysFont(name, size)
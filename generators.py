@@ -0,0 +1,60 @@
+import random
+
+from graph import Graph
+
+
+def to_graph(nodes, edges, directed=False) -> Graph:
+    graph = Graph(directed)
+    for node in nodes:
+        graph.add_node(str(node))
+    for u, v in edges:
+        graph.add_edge(str(u), str(v), directed)
+    return graph
+
+
+def complete(n, directed=False) -> Graph:
+    edges = [(u, v) for u in range(n) for v in range(n) if u != v and (directed or u < v)]
+    return to_graph(range(n), edges, directed)
+
+
+def cycle(n, directed=False) -> Graph:
+    return to_graph(range(n), [(v, (v + 1) % n) for v in range(n)], directed)
+
+
+def grid(width, height) -> Graph:
+    edges = []
+    for y in range(height):
+        for x in range(width):
+            v = y * width + x
+            if x + 1 < width:
+                edges.append((v, v + 1))
+            if y + 1 < height:
+                edges.append((v, v + width))
+    return to_graph(range(width * height), edges)
+
+
+def gnp(n, p, seed=0, directed=False) -> Graph:
+    rnd = random.Random(seed)
+    edges = [(u, v) for u in range(n) for v in range(n)
+             if u != v and (directed or u < v) and rnd.random() < p]
+    return to_graph(range(n), edges, directed)
+
+
+def eulerian(n, extra_cycles=None, seed=0) -> Graph:
+    # объединение гамильтонова цикла и случайных циклов: все степени чётные
+    rnd = random.Random(seed)
+    edges = set()
+    order = list(range(n))
+    cycles = [order]
+    for _ in range(n // 2 if extra_cycles is None else extra_cycles):
+        cycles.append(rnd.sample(order, rnd.randint(3, max(3, n // 2))))
+    for c in cycles:
+        new = {tuple(sorted((c[i], c[(i + 1) % len(c)]))) for i in range(len(c))}
+        if not new & edges and len(new) == len(c):
+            edges |= new
+    return to_graph(range(n), sorted(edges))
+
+
+def complete_bipartite(a, b) -> Graph:
+    # K(k, k + 1) -- гамильтонов путь есть, цикла нет; K(k, k + 2) -- нет и пути
+    return to_graph(range(a + b), [(u, v) for u in range(a) for v in range(a, a + b)])
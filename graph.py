@@ -1,256 +1,279 @@
-import dataclasses
-from collections import deque
+import connectivity
+import enumeration
+import euler
+import hamilton
+from adjacency import Adjacency
+from profiler import profiler
+from progress import Progress
+from states import Trace
 
 
 class Graph:
+    SOLVERS = {"euler_path": euler.euler_path, "hamilton_cycle": hamilton.hamilton_cycle,
+               "hamilton_path": hamilton.hamilton_path}
+    # результаты этих решателей общие для изоморфных графов и хранятся в ResultCache
+    SHARED = {"hamilton_cycle", "hamilton_path"}
 
-    def __init__(self, directed):
+    def __init__(self, directed, cache=None):
         self.graph = dict()
         self.directed = directed
+        # общий для графов ResultCache: изоморфный граф получает готовый результат
+        self.cache = cache
         self.nodes = set()
+        self.version = 0
+        self.edge_count = 0
+        self._core = None
+        self._core_version = -1
+        self._results = dict()
+
+        # степени и связность поддерживаются при каждом изменении графа
+        self.in_degree = dict()
+        self._odd = 0
+        self._balance = {1: 0, -1: 0, "bad": 0}
+        self._dsu = None
+        self._dsu_index = dict()
+        self._has_edges = dict()
+        self._edge_components = 0
+
+    @property
+    def core(self) -> Adjacency:
+        if self._core_version != self.version:
+            version = self.version
+            with profiler.phase("graph build"):
+                self._core = Adjacency(self.graph.keys(), self.graph, self.directed)
+            self._core_version = version
+        return self._core
+
+    def _changed(self):
+        self.version += 1
+
+    def _degree_class(self, node):
+        if self.directed:
+            delta = len(self.graph[node]) - self.in_degree[node]
+            if delta in (1, -1):
+                return delta
+            return "bad" if delta else None
+        return "odd" if len(self.graph[node]) % 2 else None
+
+    def _count_degree(self, node, sign):
+        cls = self._degree_class(node)
+        if cls == "odd":
+            self._odd += sign
+        elif cls is not None:
+            self._balance[cls] += sign
+
+    def add_node(self, node):
+        if node in self.graph:
+            return
+        self.graph[node] = set()
+        self.in_degree[node] = 0
+        self.nodes.add(node)
+        if self._dsu is not None:
+            self._dsu_index[node] = self._dsu.add()
+            self._has_edges[self._dsu_index[node]] = False
+        self._changed()
 
     def add_edge(self, node1, node2, directed):
-        if node1 not in self.graph:
-            self.graph[node1] = set()
+        self.add_node(node1)
+        self.add_node(node2)
+        if node2 in self.graph[node1]:
+            return
+        self._count_degree(node1, -1)
+        self._count_degree(node2, -1)
         self.graph[node1].add(node2)
+        self.in_degree[node2] += 1
         if not directed:
-            if node2 not in self.graph:
-                self.graph[node2] = set()
             self.graph[node2].add(node1)
-        else:
-            self.graph[node2] = self.graph.get(node2, set())
-        self.nodes.add(node1)
-        self.nodes.add(node2)
+            self.in_degree[node1] += 1
+        self._count_degree(node1, 1)
+        self._count_degree(node2, 1)
+        self.edge_count += 1
+        if self._dsu is not None:
+            self._union(node1, node2)
+        self._changed()
 
     def remove_edge(self, node1, node2):
-        if node2 in self.graph[node1]:
-            self.graph[node1].remove(node2)
-        if node1 in self.graph[node2]:
+        if node1 not in self.graph or node2 not in self.graph[node1]:
+            return
+        self._count_degree(node1, -1)
+        self._count_degree(node2, -1)
+        self.graph[node1].remove(node2)
+        self.in_degree[node2] -= 1
+        if node1 in self.graph[node2] and not self.directed:
             self.graph[node2].remove(node1)
-
-    def _is_connectivity_valid(self, graph) -> bool:
-        visited = dict()
-        for v in graph:
-            visited[v] = False
-        for v in graph:
-            if len(graph[v]) > 0:
-                self._dfs(v, visited)
-                break
-        for v in graph:
-            if len(graph[v]) > 0 and not visited[v]:
-                return False
-        return True
-
-    def _get_weak_connectivity(self) -> dict:
-        res = dict()
-        for v in self.graph:
-            res[v] = self.graph[v]
-            for u in self.graph[v]:
-                res[u] = res.get(u, set()).add(v)
-        return res
+            self.in_degree[node1] -= 1
+        self._count_degree(node1, 1)
+        self._count_degree(node2, 1)
+        self.edge_count -= 1
+        # при удалении компоненты пересчитываются заново при следующем запросе
+        self._dsu = None
+        self._changed()
+
+    def remove_node(self, node):
+        if node not in self.graph:
+            return
+        for u in list(self.graph[node]):
+            self.remove_edge(node, u)
+        # входящие дуги ищутся перебором, только если они остались: редактор
+        # удаляет рёбра вершины раньше неё самой, и удаление остаётся O(степени)
+        if self.in_degree[node]:
+            for u in list(self.graph):
+                if node in self.graph[u]:
+                    self.remove_edge(u, node)
+        self._count_degree(node, -1)
+        del self.graph[node]
+        del self.in_degree[node]
+        self.nodes.discard(node)
+        self._dsu = None
+        self._changed()
+
+    def set_directed(self, directed):
+        if directed == self.directed:
+            return
+        edges = [(u, v) for u in self.graph for v in self.graph[u] if directed or u < v]
+        nodes = list(self.graph)
+        version = self.version
+        self.__init__(directed, self.cache)
+        self.version = version + 1
+        for node in nodes:
+            self.add_node(node)
+        for u, v in edges:
+            self.add_edge(u, v, directed)
+            if directed:
+                self.add_edge(v, u, directed)
+
+    def _union(self, node1, node2):
+        dsu = self._dsu
+        r1, r2 = dsu.find(self._dsu_index[node1]), dsu.find(self._dsu_index[node2])
+        had = self._has_edges[r1] + (self._has_edges[r2] if r1 != r2 else 0)
+        dsu.union(r1, r2)
+        self._has_edges[dsu.find(r1)] = True
+        self._edge_components += 1 - had
+
+    def _ensure_components(self):
+        if self._dsu is not None:
+            return
+        self._dsu = connectivity.DisjointSet(0)
+        self._dsu_index = dict()
+        self._has_edges = dict()
+        self._edge_components = 0
+        for node in self.graph:
+            self._dsu_index[node] = self._dsu.add()
+            self._has_edges[self._dsu_index[node]] = False
+        for u in self.graph:
+            for v in self.graph[u]:
+                self._union(u, v)
+
+    def components(self) -> list:
+        self._ensure_components()
+        groups = dict()
+        for node, i in self._dsu_index.items():
+            groups.setdefault(self._dsu.find(i), set()).add(node)
+        return list(groups.values())
+
+    def is_edge_connected(self) -> bool:
+        self._ensure_components()
+        return self._edge_components <= 1
 
     def check_euler_path_directed(self) -> bool:
-        in_degree = dict()
-        out_degree = dict()
-
-        for v in self.graph:
-            out_degree[v] = len(self.graph[v])
-            for u in self.graph[v]:
-                in_degree[u] = in_degree.get(u, 0) + 1
-
-        delta = []
-        for v in self.graph:
-            delta.append(in_degree.get(v, 0) - out_degree.get(v, 0))
-
-        return delta.count(1) <= 1 and delta.count(-1) <= 1
+        if self._balance["bad"] or self._balance[1] > 1 or self._balance[-1] > 1:
+            return False
+        return self.is_edge_connected()
 
     def check_euler_path(self) -> bool:
-        if not self.graph:
+        if not self.edge_count:
             return False
 
         if self.directed:
             return self.check_euler_path_directed()
-        odd_v = 0
-        for v in self.graph:
-            if len(self.graph[v]) % 2 != 0:
-                odd_v += 1
-        if odd_v > 2:
+        if self._odd > 2:
             return False
-        return self._is_connectivity_valid(self.graph)
-
-    def _dfs(self, u, visited):
-        visited[u] = True
-        for v in self.graph[u]:
-            if not visited[v]:
-                self._dfs(v, visited)
-
-    def find_euler_path(self):
-        if not self.graph:
-            green_nodes = list(self.nodes)
-            states = [{"yellow_nodes": set(), "red_nodes": set(),
-                       "red_edges": set(), "green_nodes": green_nodes, "green_edges": set()}]
-            return states
-
-        start = list(self.graph.keys())[0]
-        for v in self.graph:
-            if len(self.graph[v]) % 2 != 0:
-                start = v
-                break
-        s = deque()
-        s.append(start)
-        res = []
-        states = []
-        yellow_nodes = set()
-        red_edges = set()
-        red_nodes = set()
-        green_edges = []
-        states.append({"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                       "red_edges": red_edges.copy(), "green_nodes": res.copy(), "green_edges": green_edges.copy()})
-        while s:
-            w = s[0]
-            yellow_nodes.add(w)
-            found_edge = False
-            if self.graph[w]:
-                u = self.graph[w].pop()
-                red_nodes.add(u)
-                red_edges.add((w, u))
-                s.appendleft(u)
-                if w in self.graph[u]:
-                    self.graph[u].remove(w)
-                found_edge = True
-            if not found_edge:
-                if s:
-                    p = s.popleft()
-                    if res:
-                        green_edges.append((res[-1], p))
-                    res.append(p)
-            state = {"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                     "red_edges": red_edges.copy(),
-                     "green_nodes": list(reversed(res.copy())),
-                     "green_edges": green_edges.copy()}
-            if states[-1] != state:
-                states.append(state)
-
-        return states
-
-    def hamilton_cycle(self):
-        visited = dict()
-        for v in self.graph:
-            visited[v] = False
-
-        path = []
-        states = []
-        yellow_nodes = set()
-        red_edges = set()
-        red_nodes = set()
-        green_edges = set()
-        states.append({"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                       "red_edges": red_edges.copy(), "green_nodes": path.copy(), "green_edges": green_edges.copy()})
-
-        def hamilton(u):
-            if path:
-                green_edges.add((path[-1], u))
-            path.append(u)
-            states.append({"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                           "red_edges": red_edges.copy(), "green_nodes": path.copy(),
-                           "green_edges": green_edges.copy()})
-            if len(path) == len(self.graph):
-                if path[-1] in self.graph[path[0]]:
-                    return True
-                else:
-                    path.pop()
-                    return False
-            visited[u] = True
-            for v in self.graph:
-                if v in self.graph[u] and not visited[v]:
-                    red_edges.add((u, v))
-                    red_nodes.add(v)
-                    states.append({"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                                   "red_edges": red_edges.copy(), "green_nodes": path.copy(),
-                                   "green_edges": green_edges.copy()})
-                    if hamilton(v):
-                        return True
-            visited[u] = False
-            path.pop()
-            states.append({"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                           "red_edges": red_edges.copy(), "green_nodes": path.copy(),
-                           "green_edges": green_edges.copy()})
-            return False
-
-        start = list(self.graph.keys())[0]
-        hamilton(start)
-        if states[-1]["green_nodes"]:
-            states[-1]["green_edges"].add((states[-1]["green_nodes"][-1], states[-1]["green_nodes"][0]))
-            states[-1]["green_nodes"].append(states[-1]["green_nodes"][0])
-
-        return states
-
-    def hamilton_path(self):
-
-        @dataclasses.dataclass
-        class Item:
-            weight: int
-            path: list
-
-        states = []
-        yellow_nodes = set()
-        red_nodes = set()
-        red_edges = set()
-        green_nodes = []
-        green_edges = set()
-        states.append({"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                       "red_edges": red_edges.copy(), "green_nodes": green_nodes.copy(),
-                       "green_edges": green_edges.copy()})
-
-        INF = 10 ** 15
-        n = len(self.nodes)
-        self.nodes = sorted(list(self.nodes))
-
-        mask_dict = dict()
-        for i in range(n):
-            mask_dict[self.nodes[i]] = i
-
-        dp = dict()
-        for v in self.nodes:
-            for mask in range(1 << n):
-                dp[v] = dp.get(v, [])
-                if mask == 1 << mask_dict[v]:
-                    dp[v].append(Item(0, [v]))
-                else:
-                    dp[v].append(Item(INF, [v]))
-
-        for mask in range(1 << n):
-            for v in self.nodes:
-                yellow_nodes.clear()
-                red_nodes.clear()
-                green_nodes.clear()
-                for u in self.nodes:
-                    if mask & (1 << mask_dict[u]):
-                        red_nodes.add(u)
-                        continue
-                    newmask = mask | (1 << mask_dict[u])
-                    yellow_nodes.add(u)
-                    if u in self.graph.get(v, set()) or (not self.directed and v in self.graph.get(u, set())):
-                        red_edges.add((v, u))
-                        if dp[v][mask].weight + 1 < dp[u][newmask].weight:
-                            dp[u][newmask].weight = dp[v][mask].weight + 1
-                            dp[u][newmask].path = dp[v][mask].path + [u]
-                            green_edges.add((v, u))
-            states.append({"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                           "red_edges": red_edges.copy(), "green_nodes": green_nodes.copy(),
-                           "green_edges": green_edges.copy()})
-
-        path_weight = INF
-        last = None
-
-        for u in self.nodes:
-            if dp[u][(1 << n) - 1].weight < path_weight:
-                path_weight = dp[u][(1 << n) - 1].weight
-                last = u
-
-        if path_weight != INF:
-            green_nodes = dp[last][(1 << n) - 1].path
-            states.append({"yellow_nodes": yellow_nodes.copy(), "red_nodes": red_nodes.copy(),
-                           "red_edges": red_edges.copy(), "green_nodes": green_nodes.copy(),
-                           "green_edges": green_edges.copy()})
-        return states
+        return self.is_edge_connected()
+
+    def solver(self, name):
+        """Снимок графа для запуска решателя name в другом потоке.
+
+        Вызывается там, где граф меняется (в потоке интерфейса): ядро строится
+        здесь, а возвращённая функция solve(progress=None, trace=None) читает
+        только неизменяемое ядро и потокобезопасный ResultCache.
+        """
+        version = self.version
+        core = self.core
+        cached = self._results.get(name)
+        results = self._results
+        cache = self.cache if name in self.SHARED else None
+        search = self.SOLVERS[name]
+
+        def solve(progress=None, trace=None):
+            # результат для неизменённого графа возвращается без повторного поиска;
+            # полная трасса подходит и тогда, когда нужен только итог
+            if trace is None:
+                trace = Trace()
+            if cached is not None and cached[0] == version and (cached[1].recording or not trace.recording):
+                return cached[1]
+            key = None
+            if cache is not None:
+                with profiler.phase("cache lookup"):
+                    key = cache.key(name, core)
+                    # из кэша известен только итог, поэтому в режиме шагов поиск идёт
+                    # заново и показывается целиком; записи старого формата -- промах
+                    value = cache.get(key[0]) if key is not None and not trace.recording else None
+                if isinstance(value, dict):
+                    order = key[1]
+                    if value["path"]:
+                        trace.result(core.labels[order[i]] for i in value["path"])
+                    trace.reason = value["reason"]
+                    trace.close()
+                    results[name] = (version, trace)
+                    return trace
+            with profiler.phase("solver search") as phase:
+                result = search(core, trace, progress or Progress())
+            result.close()
+            # запись трассы идёт внутри поиска, её время накапливает сам Trace
+            if phase.start is not None and result.record_time:
+                profiler.add("trace recording", phase.start, result.record_time)
+            results[name] = (version, result)
+            if key is not None:
+                pos = {core.labels[v]: i for i, v in enumerate(key[1])}
+                cache.put(key[0], {"path": [pos[label] for label in result[-1]["green_nodes"]],
+                                   "reason": result.reason})
+            return result
+
+        return solve
+
+    def find_euler_path(self, progress=None, trace=None):
+        return self.solver("euler_path")(progress, trace)
+
+    def hamilton_cycle(self, progress=None, trace=None):
+        return self.solver("hamilton_cycle")(progress, trace)
+
+    def hamilton_path(self, progress=None, trace=None):
+        return self.solver("hamilton_path")(progress, trace)
+
+    def _count(self, name, cycle, workers, progress):
+        version = self.version
+        cached = self._results.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        core = self.core
+        key = self.cache.key(name, core) if self.cache is not None else None
+        count = self.cache.get(key[0]) if key is not None else None
+        if count is None:
+            with profiler.phase("solver search"):
+                count = enumeration.count_all(core, cycle, workers, progress)
+            if key is not None:
+                self.cache.put(key[0], count)
+        self._results[name] = (version, count)
+        return count
+
+    def count_hamilton_cycles(self, workers=1, progress=None) -> int:
+        return self._count("hamilton_cycle_count", True, workers, progress)
+
+    def count_hamilton_paths(self, workers=1, progress=None) -> int:
+        return self._count("hamilton_path_count", False, workers, progress)
+
+    def all_hamilton_cycles(self, workers=1, progress=None):
+        return enumeration.iter_all(self.core, True, workers, progress)
+
+    def all_hamilton_paths(self, workers=1, progress=None):
+        return enumeration.iter_all(self.core, False, workers, progress)
@@ -0,0 +1,447 @@
+import math
+
+import numpy as np
+
+import analysis
+
+# таблица DP -- 2^n масок uint32 и 2^n счётчиков битов: при 24 вершинах это 80 МБ,
+# каждая следующая вершина удваивает объём, поэтому дальше работает перебор
+MAX_DP_NODES = 24
+# 20! ещё помещается в uint64, при большем числе вершин счётчики могут переполниться
+MAX_COUNT_NODES = 20
+
+
+def popcounts(n) -> np.ndarray:
+    pc = np.zeros(1 << n, dtype=np.uint8)
+    for b in range(n):
+        pc[1 << b:1 << (b + 1)] = pc[:1 << b] + 1
+    return pc
+
+
+def _bits(x) -> list:
+    res = []
+    while x:
+        low = x & -x
+        res.append(low.bit_length() - 1)
+        x ^= low
+    return res
+
+
+def reach_layers(reach, n, in_bits, progress):
+    """Заполняет reach по слоям (число вершин в маске) и отдаёт прогресс.
+
+    reach[mask] -- битовое множество вершин v, для которых существует простой путь,
+    проходящий ровно по вершинам mask и заканчивающийся в v. Перед вызовом должны
+    быть заполнены маски из одной вершины (разрешённые начала путей).
+    После каждого слоя отдаёт (k, ends, extended), где ends -- все концы путей из
+    k вершин, extended -- список пар (u, предшественники u в этом слое).
+    """
+    pc = popcounts(n)
+    for k in range(2, n + 1):
+        layer = np.flatnonzero(pc == k)
+        ends = 0
+        extended = []
+        for u in range(n):
+            progress.advance()
+            bit = 1 << u
+            masks = layer[(layer & bit) != 0]
+            prev = reach[masks ^ bit]
+            hit = (prev & np.uint32(in_bits[u])) != 0
+            if not hit.any():
+                continue
+            reach[masks[hit]] |= np.uint32(bit)
+            ends |= bit
+            extended.append((u, int(np.bitwise_or.reduce(prev[hit])) & in_bits[u]))
+        progress.advance(masks=len(layer))
+        yield k, ends, extended
+        if not ends:
+            break
+
+
+def backtrack(reach, mask, last, in_bits) -> list:
+    # восстановление пути по таблице достижимости: предыдущая вершина -- любой
+    # конец пути по mask без last, из которого есть дуга в last
+    path = [last]
+    while mask != 1 << last:
+        mask ^= 1 << last
+        last = _bits(int(reach[mask]) & in_bits[last])[0]
+        path.append(last)
+    path.reverse()
+    return path
+
+
+def _record_layer(trace, names, ends, extended):
+    for v, name in enumerate(names):
+        if ends >> v & 1:
+            trace.discard("yellow_nodes", name)
+            trace.add("red_nodes", name)
+        else:
+            trace.discard("red_nodes", name)
+            trace.add("yellow_nodes", name)
+    for u, preds in extended:
+        for v in _bits(preds):
+            trace.add("red_edges", (names[v], names[u]))
+    trace.commit()
+
+
+def _record_result(trace, names, path):
+    trace.result(names[v] for v in path)
+
+
+def hamilton_path(core, trace, progress):
+    labels = core.labels
+    n = len(core)
+    if n == 0:
+        return trace
+    trace.reason = analysis.hamilton_obstacle(core)
+    if trace.reason is not None:
+        return trace
+    if n > MAX_DP_NODES:
+        return _path_dfs(core, trace, progress)
+
+    in_bits = core.in_bits
+    reach = np.zeros(1 << n, dtype=np.uint32)
+    for v in range(n):
+        reach[1 << v] = 1 << v
+        trace.add("yellow_nodes", labels[v])
+    trace.commit()
+
+    for k, ends, extended in reach_layers(reach, n, in_bits, progress):
+        if trace.recording:
+            _record_layer(trace, labels, ends, extended)
+
+    full = (1 << n) - 1
+    ends = _bits(int(reach[full]))
+    if ends:
+        _record_result(trace, labels, backtrack(reach, full, ends[0], in_bits))
+    return trace
+
+
+def _path_dfs(core, trace, progress):
+    """Перебор с возвратом для графов, таблица DP для которых не помещается в память.
+
+    Соседи перебираются по правилу Варнсдорфа (сначала с меньшим числом свободных
+    соседей). Ветка отсекается, когда в непосещённую вершину больше нельзя войти
+    или когда больше одной вершины может стоять только в конце пути.
+    """
+    labels = core.labels
+    n = len(core)
+    directed = core.directed
+    out_bits = core.bits
+    in_bits = core.in_bits
+    full = (1 << n) - 1
+    record = trace.recording
+
+    def hopeless(visited, end) -> bool:
+        rest = full & ~visited
+        reachable = rest | 1 << end
+        terminals = 0
+        for w in _bits(rest):
+            if not in_bits[w] & reachable:
+                return True
+            # из такой вершины дальше не уйти, она может быть только концом пути
+            if (not out_bits[w] & rest) if directed else bin(out_bits[w] & reachable).count("1") == 1:
+                terminals += 1
+                if terminals > 1:
+                    return True
+        return False
+
+    def candidates(end, visited) -> list:
+        rest = full & ~visited
+        return sorted(_bits(out_bits[end] & rest), key=lambda w: bin(out_bits[w] & rest).count("1"))
+
+    # путь начинается в вершине без входящих дуг, а в неориентированном графе его
+    # можно развернуть так, чтобы он начинался в вершине степени 1
+    if directed:
+        forced = [v for v in range(n) if not in_bits[v]]
+    else:
+        forced = [v for v in range(n) if core.degree(v) == 1]
+    for start in forced[:1] or range(n):
+        path = [start]
+        visited = 1 << start
+        trace.append_path(labels[start])
+        trace.commit()
+        stack = [iter(candidates(start, visited))]
+        while stack:
+            progress.advance(steps=1)
+            v = next(stack[-1], None)
+            if v is None:
+                stack.pop()
+                visited ^= 1 << path.pop()
+                if record:
+                    trace.pop_path()
+                    trace.commit()
+                continue
+            u = path[-1]
+            if record:
+                trace.add("red_edges", (labels[u], labels[v]))
+                trace.add("red_nodes", labels[v])
+                trace.commit()
+            path.append(v)
+            visited |= 1 << v
+            if record:
+                trace.add("green_edges", (labels[u], labels[v]))
+                trace.append_path(labels[v])
+                trace.commit()
+            if visited == full:
+                _record_result(trace, labels, path)
+                return trace
+            stack.append(iter(() if hopeless(visited, v) else candidates(v, visited)))
+    return trace
+
+
+def _cycle_dp(core, trace, progress):
+    # вершина 0 -- фиксированное начало цикла, DP идёт по остальным n - 1 вершинам
+    labels = core.labels
+    n = len(core)
+    m = n - 1
+    names = labels[1:]
+    in_bits = [b >> 1 for b in core.in_bits[1:]]
+    reach = np.zeros(1 << m, dtype=np.uint32)
+    for v in range(m):
+        if core.has_edge(0, v + 1):
+            reach[1 << v] = 1 << v
+        trace.add("yellow_nodes", names[v])
+    trace.commit()
+
+    for k, ends, extended in reach_layers(reach, m, in_bits, progress):
+        if trace.recording:
+            _record_layer(trace, names, ends, extended)
+
+    full = (1 << m) - 1
+    ends = _bits(int(reach[full]) & (core.in_bits[0] >> 1))
+    if ends:
+        path = [v + 1 for v in backtrack(reach, full, ends[0], in_bits)]
+        _record_result(trace, labels, [0] + path + [0])
+    return trace
+
+
+def _cycle_dfs(core, trace, progress):
+    labels = core.labels
+    n = len(core)
+    directed = core.directed
+    out_bits = core.bits
+    in_bits = core.in_bits
+    start = min(range(n), key=core.degree)
+
+    # free_in[w] -- сколько ещё вершин может стоять в цикле перед w (непосещённые
+    # и текущий конец пути), free_out[w] -- после w (непосещённые и начало).
+    # В неориентированном графе вершине нужны два разных свободных соседа, поэтому
+    # используется один счётчик free_in с порогом 2.
+    free_in = [bin(in_bits[v]).count("1") for v in range(n)]
+    free_out = [bin(out_bits[v]).count("1") for v in range(n)]
+    need = 1 if directed or n == 2 else 2
+    visited = bytearray(n)
+    if any(free_in[v] < need or free_out[v] < 1 for v in range(n)):
+        return trace
+
+    def move(a, b) -> tuple:
+        # обновляет счётчики при переходе a -> b, возвращает журнал для отката
+        log = []
+        ok = True
+        if directed or a != start:
+            for w in _bits(out_bits[a]):
+                if w == b or (visited[w] and w != start):
+                    continue
+                free_in[w] -= 1
+                log.append((free_in, w))
+                if free_in[w] < (1 if w == start else need):
+                    ok = False
+        if directed:
+            for w in _bits(in_bits[b]):
+                if visited[w]:
+                    continue
+                free_out[w] -= 1
+                log.append((free_out, w))
+                if free_out[w] < 1:
+                    ok = False
+        return log, ok
+
+    def undo(log):
+        for counter, w in log:
+            counter[w] += 1
+
+    def candidates(end) -> list:
+        res = [w for w in core.neighbours(end) if not visited[w]]
+        if directed:
+            forced = [w for w in res if free_in[w] == 1]
+        elif end != start:
+            forced = [w for w in res if free_in[w] == 2]
+        else:
+            forced = []
+        if len(forced) > 1:
+            return []
+        return forced or res
+
+    record = trace.recording
+    path = [start]
+    visited[start] = 1
+    trace.append_path(labels[start])
+    trace.commit()
+    stack = [(start, iter(candidates(start)), [])]
+    found = False
+    while stack:
+        progress.advance(steps=1)
+        u, it, log = stack[-1]
+        v = next(it, None)
+        if v is None:
+            stack.pop()
+            undo(log)
+            visited[u] = 0
+            path.pop()
+            if record:
+                trace.pop_path()
+                trace.commit()
+            continue
+        if record:
+            trace.add("red_edges", (labels[u], labels[v]))
+            trace.add("red_nodes", labels[v])
+            trace.commit()
+        move_log, ok = move(u, v)
+        visited[v] = 1
+        path.append(v)
+        if record:
+            trace.add("green_edges", (labels[u], labels[v]))
+            trace.append_path(labels[v])
+            trace.commit()
+        if len(path) == n:
+            if core.has_edge(v, start):
+                found = True
+                break
+            undo(move_log)
+            visited[v] = 0
+            path.pop()
+            if record:
+                trace.pop_path()
+            continue
+        stack.append((v, iter(candidates(v) if ok else ()), move_log))
+
+    if found:
+        _record_result(trace, labels, path + [start])
+    return trace
+
+
+def _dfs_is_cheaper(core) -> bool:
+    # оценка сверху размера дерева перебора с учётом того, что в вершину уже
+    # пришли по одному из рёбер, против n * 2^(n - 1) операций DP
+    n = len(core)
+    dfs_cost = sum(math.log2(max(1, core.degree(v) - (0 if core.directed else 1))) for v in range(n))
+    dp_cost = math.log2(n) + n - 1
+    return n - 1 > MAX_DP_NODES or dfs_cost <= dp_cost
+
+
+def hamilton_cycle(core, trace, progress):
+    n = len(core)
+    if n < 2:
+        return trace
+    trace.reason = analysis.hamilton_obstacle(core, cycle=True)
+    if trace.reason is not None:
+        return trace
+    if _dfs_is_cheaper(core):
+        return _cycle_dfs(core, trace, progress)
+    return _cycle_dp(core, trace, progress)
+
+
+def _count_layers(n, in_bits, starts, progress) -> np.ndarray:
+    """Число простых путей по всем n вершинам для каждого конца.
+
+    Хранятся только два соседних слоя: count[pos[mask], v] -- сколько путей
+    проходит ровно по вершинам mask и заканчивается в v. starts -- битовое
+    множество разрешённых начал.
+    """
+    pc = popcounts(n)
+    pos = np.zeros(1 << n, dtype=np.int32)
+    layer = 1 << np.arange(n, dtype=np.int64)
+    pos[layer] = np.arange(n)
+    count = np.zeros((n, n), dtype=np.uint64)
+    for v in _bits(starts):
+        count[v, v] = 1
+    for k in range(2, n + 1):
+        progress.advance(masks=len(layer))
+        prev = count
+        layer = np.flatnonzero(pc == k)
+        pos[layer] = np.arange(len(layer))
+        count = np.zeros((len(layer), n), dtype=np.uint64)
+        for u in range(n):
+            progress.advance()
+            preds = _bits(in_bits[u])
+            if not preds:
+                continue
+            bit = 1 << u
+            masks = layer[(layer & bit) != 0]
+            rows = pos[masks ^ bit]
+            count[pos[masks], u] = prev[rows][:, preds].sum(axis=1)
+    return count[0]
+
+
+def count_paths(core, progress) -> int:
+    n = len(core)
+    if n < 2:
+        return n
+    if n > MAX_COUNT_NODES:
+        raise ValueError(f"too many nodes for counting DP: {n}")
+    total = int(_count_layers(n, core.in_bits, (1 << n) - 1, progress).sum())
+    # в неориентированном графе каждый путь посчитан в обе стороны
+    return total if core.directed else total // 2
+
+
+def count_cycles(core, progress) -> int:
+    n = len(core)
+    if n < 2:
+        return 0
+    if n - 1 > MAX_COUNT_NODES:
+        raise ValueError(f"too many nodes for counting DP: {n}")
+    # как в _cycle_dp: вершина 0 -- начало, DP по остальным вершинам
+    in_bits = [b >> 1 for b in core.in_bits[1:]]
+    ends = _count_layers(n - 1, in_bits, core.bits[0] >> 1, progress)
+    total = int(ends[_bits(core.in_bits[0] >> 1)].sum())
+    return total if core.directed or n == 2 else total // 2
+
+
+def extend_paths(bits, in_bits, prefix, cycle=False, unique=False):
+    """Отдаёт все гамильтоновы пути (для cycle -- циклы) с началом prefix.
+
+    Вершины -- номера 0..n-1, bits и in_bits -- битовые множества соседей как в
+    Adjacency. Цикл отдаётся с повторённой в конце начальной вершиной. При unique
+    путь и его разворот отдаются один раз: путь -- если начало меньше конца,
+    цикл -- если вторая вершина меньше предпоследней.
+    """
+    n = len(bits)
+    full = (1 << n) - 1
+    start = prefix[0]
+    path = list(prefix)
+    visited = 0
+    for v in path:
+        visited |= 1 << v
+
+    def accept():
+        if cycle:
+            if not bits[path[-1]] >> start & 1:
+                return False
+            return not unique or len(path) < 3 or path[1] < path[-1]
+        return not unique or len(path) < 2 or path[0] < path[-1]
+
+    if visited == full:
+        if accept():
+            yield path + [start] if cycle else list(path)
+        return
+    stack = [bits[path[-1]] & ~visited]
+    while stack:
+        cand = stack[-1]
+        if not cand:
+            stack.pop()
+            visited ^= 1 << path.pop()
+            continue
+        low = cand & -cand
+        stack[-1] = cand ^ low
+        path.append(low.bit_length() - 1)
+        visited |= low
+        if visited == full:
+            if accept():
+                yield path + [start] if cycle else list(path)
+        elif not cycle or in_bits[start] & ~visited:
+            # в цикле в начало должна вести дуга из ещё не посещённой вершины
+            stack.append(bits[path[-1]] & ~visited)
+            continue
+        path.pop()
+        visited ^= low
@@ -0,0 +1,98 @@
+import numpy as np
+
+ARROW_ANGLES = np.radians([0, -120, 120])
+
+
+def arrow_geometry(starts, ends, directed, node_radius, arrow_radius, line_width) -> tuple:
+    """Концы отрезков, вершины стрелок и ограничивающие прямоугольники для k рёбер.
+
+    starts, ends -- массивы k x 2 центров вершин, directed -- k флагов. Считает
+    то же, что Edge._arrow_geometry, но для всех рёбер сразу. У ненаправленных
+    рёбер вершины стрелки совпадают с концом отрезка и не влияют на рамку.
+    """
+    v = ends - starts
+    length = np.hypot(v[:, 0], v[:, 1])
+    v = v / np.where(length > 0, length, 1)[:, None]
+    line_start = starts + v * node_radius
+    line_end = ends - v * node_radius
+    rotation = np.arctan2(line_start[:, 1] - line_end[:, 1], line_end[:, 0] - line_start[:, 0]) + np.pi / 2
+    angles = rotation[:, None] + ARROW_ANGLES
+    triangles = np.empty((len(v), 3, 2))
+    triangles[:, :, 0] = line_end[:, None, 0] + arrow_radius * np.sin(angles)
+    triangles[:, :, 1] = line_end[:, None, 1] + arrow_radius * np.cos(angles)
+    triangles[~directed] = line_end[~directed, None, :]
+    points = np.concatenate((line_start[:, None], line_end[:, None], triangles), axis=1)
+    low = np.floor(points.min(axis=1)).astype(int) - line_width
+    high = np.ceil(points.max(axis=1)).astype(int) + line_width
+    boxes = np.concatenate((low, high - low), axis=1)
+    return line_start, line_end, triangles, boxes
+
+
+class EdgeLayout:
+    """Центры вершин в одном массиве и пересчёт геометрии изменившихся рёбер.
+
+    Вершина при перемещении записывает новый центр и помечает свои рёбра,
+    ребро -- себя при смене цвета или направления; refresh() пересчитывает все
+    помеченные рёбра одним проходом arrow_geometry и перерисовывает их.
+    """
+
+    def __init__(self, node_radius, arrow_radius, line_width):
+        self.node_radius = node_radius
+        self.arrow_radius = arrow_radius
+        self.line_width = line_width
+        self.centers = np.zeros((16, 2))
+        self._slots = dict()
+        self._free = []
+        self._dirty = set()
+
+    def _center(self, node):
+        return node.pos.x + node.RADIUS, node.pos.y + node.RADIUS
+
+    def add_node(self, node):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._slots)
+            if slot == len(self.centers):
+                self.centers = np.concatenate((self.centers, np.zeros_like(self.centers)))
+        self._slots[node] = slot
+        self.centers[slot] = self._center(node)
+
+    def remove_node(self, node):
+        slot = self._slots.pop(node, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def moved(self, node):
+        slot = self._slots.get(node)
+        if slot is None:
+            return
+        self.centers[slot] = self._center(node)
+        for edge, _ in node.edges.values():
+            if edge.layout is self:
+                self._dirty.add(edge)
+
+    def invalidate(self, edge):
+        self._dirty.add(edge)
+
+    def remove_edge(self, edge):
+        self._dirty.discard(edge)
+
+    def refresh(self):
+        if not self._dirty:
+            return
+        edges = list(self._dirty)
+        self._dirty.clear()
+        slots = self._slots
+        centers = self.centers
+        starts = centers[[slots[edge.current_node1] for edge in edges]]
+        ends = centers[[slots[edge.current_node2] for edge in edges]]
+        directed = [edge.current_directed for edge in edges]
+        line_start, line_end, triangles, boxes = arrow_geometry(starts, ends, np.array(directed, dtype=bool),
+                                                                self.node_radius, self.arrow_radius,
+                                                                self.line_width)
+        # поэлементный доступ к массивам numpy медленнее, чем к спискам
+        boxes, line_start, line_end = boxes.tolist(), line_start.tolist(), line_end.tolist()
+        triangles = triangles.tolist()
+        for i, edge in enumerate(edges):
+            edge.render(boxes[i], line_start[i], line_end[i], triangles[i] if directed[i] else ())
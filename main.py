@@ -1,8 +1,23 @@
+import argparse
+import gc
+import time
+
 import pygame_gui as pg_gui
 
 import objects
+import storage
+from autolayout import ForceLayout
+from cache import ResultCache, user_cache_path
+from camera import Camera
+from allocator import NumberAllocator
 from consts import *
+from fonts import get_font
 from graph import Graph
+from profiler import profiler
+from layout import EdgeLayout
+from spatial import SpatialHash
+from states import ResultTrace, Trace
+from worker import AlgorithmWorker
 
 pg.init()
 
@@ -11,20 +26,6 @@ def _fix_pos(v: pg.Vector2) -> pg.Vector2:
     return v - pg.Vector2(1, 1) * (CELL_SIZE // 2)
 
 
-def mex(a: list):
-    if not a:
-        return 1
-    a.sort()
-    if a[0] > 1:
-        return 1
-    if len(a) == 1:
-        return a[0] + 1
-    for i in range(len(a) - 1):
-        if a[i] + 1 != a[i + 1]:
-            return a[i] + 1
-    return a[-1] + 1
-
-
 class Game:
     ADD_NODE_MOD = 1
     MOVE_NODE_MOD = 5
@@ -32,13 +33,48 @@ class Game:
     ADD_DIRECTED_EDGE_MOD = 3
     REMOVE_MOD = 4
 
+    YELLOW = pg.Color("#FFFF80")
+    RED = pg.Color("#FF3812")
+    GREEN = pg.Color("#8FFEAB")
+    DARK_GREEN = pg.Color("#008D00")
+    EMPTY_STATE_VIEW = (dict(), dict(), dict(), False)
+
+    PANEL_RECT = pg.Rect(WIDTH - 230, 0, 230, HEIGHT)
+    UI_SETTLE_TIME = 0.5
+    OVERLAY_RECT = pg.Rect(10, 10, 280, 260)
+    OVERLAY_INTERVAL = 0.25
+    SCROLL_GROW_INTERVAL = 0.5
+    # при большем числе областей или большей их доле экрана дешевле перерисовать всё
+    MAX_DIRTY_RECTS = 64
+    MAX_DIRTY_SHARE = 0.25
+
+    ZOOM_STEP = 1.1
+    DETAIL_ZOOM = 0.5  # мельче -- без номеров вершин и стрелок
+    POINT_ZOOM = 0.2  # мельче -- вершины точками
+    SCALED_CACHE_SIZE = 4096
+
+    LAYOUT_BUDGET = 0.008  # секунд укладки на кадр
+    LAYOUT_APPLY_INTERVAL = 0.25
+    LAYOUT_MARGIN = 100
+
+    PLAYBACK_RATE = 30  # шагов в секунду
+    MAX_PLAYBACK_RATE = 1 << 20
+
     MODES = {ADD_NODE_MOD: "Добавить вершину", ADD_EDGE_MOD: "Добавить дугу", REMOVE_MOD: "Удалить",
              MOVE_NODE_MOD: "Переместить вершину"}
 
-    def __init__(self):
+    SAVE_PATH = "graph.json"
+
+    def __init__(self, path=None, cache_path=None):
+        self.path = path or self.SAVE_PATH
+        # на диск результаты пишутся только по запросу (--cache), иначе кэш живёт в памяти
+        self.cache = ResultCache(path=cache_path)
         self.edges_group = None
         self.nodes_group = None
-        self.current_node_number = None
+        self.spatial = None
+        self.layout = None
+        self.graph = None
+        self.numbers = None
         self.objects_group = None
         self.running = False
         self.selected_nodes = []
@@ -50,15 +86,43 @@ class Game:
         self.result_edges = None
         self.states = []
         self.current_state = 0
+        self.playing = False
+        self.playback_rate = self.PLAYBACK_RATE
+        self._playback_from = (0.0, 0)
         self.message = ""
         self.message_time = ""
         self.algorithm = "Эйлеров путь(цикл)"
+        self.record_steps = True
         self.ui_manager = pg_gui.UIManager((WIDTH, HEIGHT), theme_path="theme.json")
         self.directed = False
 
         self.moving_node_start_position = ()
         self.moving_node = None
 
+        self.camera = Camera(WIDTH, HEIGHT)
+        self._panning = False
+        self._scaled = dict()
+
+        self.worker = None
+        self._scroll_grown = 0
+
+        self.auto_layout = None
+        self._layout_nodes = []
+        self._layout_applied = 0
+
+        self._node_index = dict()
+        self._edge_index = dict()
+        self._state_shown = self.EMPTY_STATE_VIEW
+        self.shown_state = None
+
+        self._full_redraw = True
+        self._panel_dirty = True
+        self._drawn_panel = None
+        self._drawn = dict()
+        self._ui_active_until = 0
+        self._overlay = None
+        self._overlay_time = 0
+
         self.load_settings()
 
     def load_settings(self):
@@ -66,10 +130,17 @@ class Game:
         self.objects_group = pg.sprite.Group()
         self.nodes_group = pg.sprite.Group()
         self.edges_group = pg.sprite.Group()
-        self.current_node_number = 1
+        self.spatial = SpatialHash(CELL_SIZE)
+        self.layout = self._new_layout()
+        self.graph = Graph(self.directed, self.cache)
+        self.numbers = NumberAllocator()
 
         self.load_objects()
 
+    @staticmethod
+    def _new_layout() -> EdgeLayout:
+        return EdgeLayout(objects.Node.RADIUS, objects.Edge.ARROW_RADIUS, objects.Edge.LINE_WIDTH)
+
     def load_objects(self):
         self._load_gui()
 
@@ -81,15 +152,8 @@ class Game:
         self.move_node_button = pg_gui.elements.UIButton(relative_rect=pg.Rect((WIDTH - 220, y + 30), (200, 25)),
                                                         text="Переместить вершину",
                                                         manager=self.ui_manager)
-        self.edge_type_drop_down = pg_gui.elements.UIDropDownMenu(options_list=["Неориентированный",
-                                                                                "Ориентированный"],
-                                                                  starting_option="Неориентированный",
-                                                                  relative_rect=pg.Rect((WIDTH - 220, y + 60),
-                                                                                        (200, 25)),
-                                                                  manager=self.ui_manager,
-                                                                  object_id=pg_gui.core.ObjectID(
-                                                                      object_id="#alg_drop_down",
-                                                                      class_id="@drop_down"))
+        self.edge_type_drop_down = None
+        self._set_up_edge_type_drop_down()
         self.add_edge_button = pg_gui.elements.UIButton(relative_rect=pg.Rect((WIDTH - 220, y + 90), (200, 25)),
                                                         text="Дуга",
                                                         manager=self.ui_manager)
@@ -112,12 +176,34 @@ class Game:
         self.run_algorithm_button = pg_gui.elements.UIButton(relative_rect=pg.Rect((WIDTH - 220, y + 210), (200, 25)),
                                                              text="Запустить алгоритм",
                                                              manager=self.ui_manager)
-        self.state_scroll = pg_gui.elements.UIHorizontalSlider(relative_rect=pg.Rect((WIDTH - 220, 270), (200, 25)),
+        self.steps_drop_down = pg_gui.elements.UIDropDownMenu(options_list=["Показывать шаги", "Только результат"],
+                                                             starting_option="Показывать шаги",
+                                                             relative_rect=pg.Rect((WIDTH - 220, y + 240),
+                                                                                   (200, 25)),
+                                                             manager=self.ui_manager,
+                                                             object_id=pg_gui.core.ObjectID(
+                                                                 object_id="#alg_drop_down",
+                                                                 class_id="@drop_down"))
+        self.state_scroll = pg_gui.elements.UIHorizontalSlider(relative_rect=pg.Rect((WIDTH - 220, 300), (200, 25)),
                                                                start_value=0, value_range=(0, 0), visible=False,
                                                                manager=self.ui_manager)
 
-    def check_events(self):
-        for event in pg.event.get():
+    def _set_up_edge_type_drop_down(self):
+        if self.edge_type_drop_down is not None:
+            self.edge_type_drop_down.kill()
+        self.edge_type_drop_down = pg_gui.elements.UIDropDownMenu(options_list=["Неориентированный",
+                                                                                "Ориентированный"],
+                                                                  starting_option=["Неориентированный",
+                                                                                   "Ориентированный"][self.directed],
+                                                                  relative_rect=pg.Rect((WIDTH - 220, 90),
+                                                                                        (200, 25)),
+                                                                  manager=self.ui_manager,
+                                                                  object_id=pg_gui.core.ObjectID(
+                                                                      object_id="#alg_drop_down",
+                                                                      class_id="@drop_down"))
+
+    def check_events(self, events):
+        for event in events:
             if event.type == pg_gui.UI_BUTTON_PRESSED:
                 if event.ui_element == self.add_node_button:
                     self.set_mode(self.ADD_NODE_MOD)
@@ -135,6 +221,8 @@ class Game:
             if event.type == pg_gui.UI_DROP_DOWN_MENU_CHANGED:
                 if event.ui_element == self.algorithm_dropdown_menu:
                     self.algorithm = event.text
+                elif event.ui_element == self.steps_drop_down:
+                    self.record_steps = event.text == "Показывать шаги"
                 elif event.ui_element == self.edge_type_drop_down:
                     if event.text == "Неориентированный":
                         self.directed = False
@@ -142,12 +230,25 @@ class Game:
                         self.directed = True
                     self._default_state()
                     self._destroy_all_edges()
+                    self.graph.set_directed(self.directed)
+
+            if event.type in (pg.VIDEOEXPOSE, pg.WINDOWEXPOSED, pg.WINDOWRESTORED):
+                self._full_redraw = True
 
             if event.type == pg.QUIT:
                 self.running = False
+            elif event.type == pg.MOUSEWHEEL and pg.mouse.get_pos()[0] < WIDTH - 220:
+                self.camera.zoom_at(pg.mouse.get_pos(), self.ZOOM_STEP ** event.y)
+                self._full_redraw = True
+            elif event.type == pg.MOUSEBUTTONDOWN and event.button == RMB:
+                self._panning = pg.mouse.get_pos()[0] < WIDTH - 220
+            elif event.type == pg.MOUSEBUTTONUP and event.button == RMB:
+                self._panning = False
+            elif event.type == pg.MOUSEMOTION and self._panning:
+                self.camera.pan(*event.rel)
+                self._full_redraw = True
             elif event.type == pg.MOUSEBUTTONDOWN and event.button == LMB and self.mode == self.MOVE_NODE_MOD:
-                colliders = list(
-                    filter(lambda obj: obj.rect.collidepoint(pg.mouse.get_pos()), self.nodes_group))
+                colliders = self._nodes_at(self._mouse_world())
                 if colliders:
                     self.moving_node = colliders[0]
                     x, y = self.moving_node.pos
@@ -163,24 +264,22 @@ class Game:
                     self.moving_node = None
                 if x < WIDTH - 220:  # чтобы нельзя было поставить вершину рядом с кнопками
                     if event.button == LMB:
-                        v = pg.Vector2(x, y)
+                        v = self._mouse_world()
                         if self.mode == self.ADD_NODE_MOD:
-                            colliders = list(
-                                filter(lambda obj: obj.rect.collidepoint(pg.mouse.get_pos()), self.nodes_group))
+                            colliders = self._nodes_at(v)
                             if not colliders:
-                                self.current_node_number = mex([int(node.number) for node in self.nodes_group])
-                                node = objects.Node(*v, self.current_node_number)
+                                node = objects.Node(*v, self.numbers.allocate())
                                 self.add_node(node)
                                 self.selected_nodes.clear()
                         elif self.mode == self.ADD_EDGE_MOD or self.mode == self.ADD_DIRECTED_EDGE_MOD:
-                            colliders = list(
-                                filter(lambda obj: obj.rect.collidepoint(pg.mouse.get_pos()), self.nodes_group))
+                            colliders = self._nodes_at(v)
                             if colliders:
                                 node = colliders[0]
                                 self.select_node(node)
                         elif self.mode == self.REMOVE_MOD:
-                            colliders = list(
-                                filter(lambda obj: obj.rect.collidepoint(pg.mouse.get_pos()), self.objects_group))
+                            colliders = self.spatial.query_point(v)
+                            if colliders:
+                                self._default_state()
                             for collider in colliders:
                                 collider.destroy()
 
@@ -195,8 +294,32 @@ class Game:
                     self.set_mode(self.MOVE_NODE_MOD)
                 elif event.key == pg.K_RETURN:
                     self.run_algorithm()
+                elif event.key == pg.K_s and event.mod & pg.KMOD_CTRL:
+                    self.save(self.path)
+                elif event.key == pg.K_o and event.mod & pg.KMOD_CTRL:
+                    self.load(self.path)
+                elif event.key == pg.K_l:
+                    self.start_layout()
+                elif event.key == pg.K_HOME:
+                    self.camera.reset()
+                    self._full_redraw = True
+                elif event.key == pg.K_F3:
+                    self.toggle_profiler()
+                elif event.key == pg.K_F4:
+                    self.export_profile()
                 elif event.key == pg.K_ESCAPE:
-                    self._default_state()
+                    if self.auto_layout is not None:
+                        self.finish_layout(cancelled=True)
+                    elif self.worker is not None:
+                        self.worker.cancel()
+                    else:
+                        self._default_state()
+                elif event.key == pg.K_SPACE:
+                    self.toggle_playback()
+                elif event.key in (pg.K_EQUALS, pg.K_PLUS, pg.K_KP_PLUS):
+                    self.change_playback_rate(2)
+                elif event.key in (pg.K_MINUS, pg.K_KP_MINUS):
+                    self.change_playback_rate(0.5)
                 elif event.key == pg.K_RIGHT and self.checking_result:
                     if self.states:
                         if self.current_state + 1 < len(self.states):
@@ -212,92 +335,226 @@ class Game:
 
     def clear(self):
         self._default_state()
-        for obj in self.objects_group:
-            obj.destroy()
+        self.auto_layout = None
+        self._layout_nodes = []
+        # удаляется всё сразу: группы пустеют, а индекс, геометрия, модель и номера
+        # создаются заново, вместо destroy() для каждой вершины и дуги
+        for group in (self.objects_group, self.nodes_group, self.edges_group):
+            group.empty()
+        self.spatial = SpatialHash(CELL_SIZE)
+        self.layout = self._new_layout()
+        self.graph = Graph(self.directed, self.cache)
+        self.numbers.reset()
 
     def _default_state(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        # скрытый ползунок не должен хранить номер шага прошлой трассы
+        self.state_scroll.set_current_value(0)
         self.state_scroll.hide()
         for node in self.selected_nodes:
             node.unselect()
         self.selected_nodes.clear()
-        for edge in self.edges_group:
-            edge.default()
+        self._default_objects()
+        self._state_shown = self.EMPTY_STATE_VIEW
+        self.shown_state = None
         self.checking_result = False
+        self.playing = False
         self.states = []
         self.current_state = 0
         self.message = ""
         self.message_time = ""
 
-    def set_state(self, state: dict):
-        yellow_nodes = state["yellow_nodes"]
-        red_nodes = state["red_nodes"]
-        red_edges = state["red_edges"]
-        green_nodes = state["green_nodes"]
-        green_edges = state["green_edges"]
-        for node in self.nodes_group:
-            if node.number in yellow_nodes:
-                node.color = pg.Color("#FFFF80")
-            if node.number in red_nodes:
-                node.color = pg.Color("#FF3812")
-            if node.number in green_nodes:
-                node.color = pg.Color("#8FFEAB")
+    def _build_indexes(self):
+        self._node_index = {node.number: node for node in self.nodes_group}
+        self._edge_index = dict()
         for edge in self.edges_group:
-            if (edge.node1.number, edge.node2.number) in red_edges \
-                    or (edge.node2.number, edge.node1.number) in red_edges:
-                edge.color = pg.Color("#FF3812")
-            if (edge.node1.number, edge.node2.number) in green_edges \
-                    or (edge.node2.number, edge.node1.number) in green_edges:
-                edge.color = pg.Color("#008D00")
-
-        edges = set(self.edges_group)
+            self._edge_index[(edge.node1.number, edge.node2.number)] = edge
+            self._edge_index[(edge.node2.number, edge.node1.number)] = edge
+
+    def _state_view(self, state: dict) -> tuple:
+        node_colors = dict()
+        for key, color in (("yellow_nodes", self.YELLOW), ("red_nodes", self.RED), ("green_nodes", self.GREEN)):
+            for number in state[key]:
+                node = self._node_index.get(number)
+                if node is not None:
+                    node_colors[node] = color
+        edge_colors = dict()
+        for key, color in (("red_edges", self.RED), ("green_edges", self.DARK_GREEN)):
+            for pair in state[key]:
+                edge = self._edge_index.get(pair)
+                if edge is not None:
+                    edge_colors[edge] = color
+        directions = dict()
+        green_nodes = state["green_nodes"]
         for i in range(len(green_nodes) - 1):
-            for edge in self.edges_group:
-                if edge.node1.number == green_nodes[i] and edge.node2.number == green_nodes[i + 1]:
-                    edge.set_direction(edge.node1, edge.node2)
-                    edges.remove(edge)
-                elif edge.node2.number == green_nodes[i] and edge.node1.number == green_nodes[i + 1]:
-                    edge.set_direction(edge.node2, edge.node1)
-                    edges.remove(edge)
-        if green_nodes:
-            for edge in edges:
-                edge.current_directed = False
+            edge = self._edge_index.get((green_nodes[i], green_nodes[i + 1]))
+            if edge is not None:
+                directions[edge] = (self._node_index[green_nodes[i]], self._node_index[green_nodes[i + 1]])
+        return node_colors, edge_colors, directions, bool(green_nodes)
+
+    def set_state(self, state: dict):
+        with profiler.phase("set_state"):
+            self._set_state(state)
+
+    def _set_state(self, state: dict):
+        # меняем только те вершины и дуги, вид которых отличается от предыдущего шага
+        node_colors, edge_colors, directions, has_path = view = self._state_view(state)
+        old_node_colors, old_edge_colors, old_directions, old_has_path = self._state_shown
+
+        for node in old_node_colors.keys() - node_colors.keys():
+            node.default()
+        for node, color in node_colors.items():
+            if old_node_colors.get(node) != color:
+                node.color = color
+
+        if has_path != old_has_path:
+            edges = self.edges_group
+        else:
+            edges = (old_edge_colors.keys() | edge_colors.keys() | old_directions.keys() | directions.keys())
+        for edge in edges:
+            edge.color = edge_colors.get(edge, edge.COLOR)
+            if edge in directions:
+                edge.set_direction(*directions[edge])
+            else:
+                edge.current_node1, edge.current_node2 = edge.node1, edge.node2
+                edge.current_directed = edge.directed and not has_path
+
+        self._state_shown = view
 
     def run_algorithm(self):
-        import time
         self._default_state()
-        graph = Graph(self.directed)
-        for edge in self.edges_group:
-            graph.add_edge(edge.node1.number, edge.node2.number, edge.directed)
-        states = []
-        start_time = time.time()
-        if self.algorithm == "Эйлеров путь(цикл)":
-            if graph.check_euler_path():
-                states = graph.find_euler_path()
-            else:
-                self.message = f"{self.algorithm} не существует"
-                return
-        elif self.algorithm == "Гамильтонов цикл":
-            states = graph.hamilton_cycle()
-            if not states[-1]["green_nodes"]:
-                self.message = f"{self.algorithm} не существует"
-                return
-        elif self.algorithm == "Гамильтонов путь":
-            states = graph.hamilton_path()
-            if not states[-1]["green_nodes"]:
-                self.message = f"{self.algorithm} не существует"
-                return
-        result_time = time.time() - start_time
+        graph = self.graph
+        algorithm = self.algorithm
+        trace = Trace() if self.record_steps else ResultTrace()
+        solve = self._solver(graph, algorithm)
+        self.worker = AlgorithmWorker(lambda progress: solve(progress, trace), algorithm)
+        self.worker.start()
+        self.message = f"{algorithm}: поиск..."
+        if trace.recording:
+            # шаги показываются по мере того, как решатель их записывает
+            self._show_states(trace)
+
+    @staticmethod
+    def _solver(graph, algorithm):
+        # снимок графа и проверки делаются в потоке интерфейса: фоновый поток
+        # не читает граф, который редактор меняет в это время
+        if algorithm == "Эйлеров путь(цикл)":
+            if not graph.check_euler_path():
+                return lambda progress, trace: None
+            return graph.solver("euler_path")
+        elif algorithm == "Гамильтонов цикл":
+            return graph.solver("hamilton_cycle")
+        elif algorithm == "Гамильтонов путь":
+            return graph.solver("hamilton_path")
+
+    def _show_states(self, states, current=0):
         self.checking_result = True
         self.states = states
-        self.set_state(self.states[0])
-        self.message = f"{self.algorithm}: " + " ".join(states[-1]["green_nodes"])
-        self.message_time = f"Время работы: {round(result_time * 1000, 3)} мс"
-        self._set_up_state_scroll()
+        self._build_indexes()
+        self.set_state(self.states[current])
+        self.current_state = self.shown_state = current
+        self.state_scroll.hide()
+        self._grow_state_scroll()
 
-    def _set_up_state_scroll(self):
+    def _grow_state_scroll(self):
+        if len(self.states) < 2:
+            return
+        if self.state_scroll.visible and self.state_scroll.value_range[1] == len(self.states) - 1:
+            return
+        self._scroll_grown = time.perf_counter()
+        self._set_up_state_scroll(self.current_state)
+
+    def _check_worker(self):
+        if self.worker is None:
+            return
+        worker = self.worker
+        if not worker.done:
+            progress = worker.progress
+            self.message_time = f"Шагов: {progress.steps}, масок: {progress.masks} (Esc - отмена)"
+            # ползунок пересоздаётся не чаще раза в SCROLL_GROW_INTERVAL и не во время перетаскивания
+            if (self.checking_result and time.perf_counter() >= self._scroll_grown + self.SCROLL_GROW_INTERVAL
+                    and not any(pg.mouse.get_pressed())):
+                self._grow_state_scroll()
+            return
+        self.worker = None
+        self.message_time = ""
+        if worker.error is not None:
+            # ошибка решателя не должна закрывать редактор
+            self._default_state()
+            self.message = f"{worker.name}: ошибка"
+            self.message_time = str(worker.error)
+            return
+        if worker.cancelled:
+            self.message = f"{worker.name}: прерван"
+            if self.checking_result:
+                self._grow_state_scroll()
+            return
+        states = worker.result
+        if not states or not states[-1]["green_nodes"]:
+            self.message = f"{worker.name} не существует"
+            if states is not None and states.reason is not None:
+                self.message += f" ({states.reason})"
+            if self.checking_result:
+                self._grow_state_scroll()
+            return
+        if states is self.states:
+            self._grow_state_scroll()
+        else:
+            # результат из кэша графа или режим "только результат"
+            self._show_states(states, 0 if states.recording else len(states) - 1)
+        self.message = f"{worker.name}: " + " ".join(states[-1]["green_nodes"])
+        self.message_time = f"Время работы: {round(worker.elapsed * 1000, 3)} мс"
+
+    def toggle_playback(self):
+        if not self.checking_result or len(self.states) < 2:
+            return
+        self.playing = not self.playing
+        if self.playing:
+            current = self.current_state
+            if current >= len(self.states) - 1 and self.worker is None:
+                # с последнего шага воспроизведение начинается заново
+                current = 0
+                self.state_scroll.set_current_value(current)
+            self._playback_from = (time.perf_counter(), current)
+
+    def change_playback_rate(self, factor):
+        rate = min(self.MAX_PLAYBACK_RATE, max(1, round(self.playback_rate * factor)))
+        if rate != self.playback_rate:
+            self.playback_rate = rate
+            self._playback_from = (time.perf_counter(), self.current_state)
+
+    def _step_playback(self):
+        # номер шага считается по часам, а не по кадрам: если шагов в секунду больше,
+        # чем кадров, промежуточные шаги пропускаются и за кадр применяется только последний
+        if not self.checking_result or len(self.states) < 2:
+            self.playing = False
+            return
+        if not self.state_scroll.visible:
+            return
+        now = time.perf_counter()
+        value = self.state_scroll.current_value
+        if value != self.shown_state:
+            # ползунок сдвинули руками или стрелками -- воспроизведение идёт дальше от него
+            self._playback_from = (now, value)
+        start, first = self._playback_from
+        last = min(self.state_scroll.value_range[1], len(self.states) - 1)
+        target = first + int((now - start) * self.playback_rate)
+        if target >= last:
+            target = last
+            if self.worker is None:
+                self.playing = False
+            else:
+                # решатель ещё пишет шаги, ползунок дорастёт -- ждём на последнем
+                self._playback_from = (now, last)
+        if target != value:
+            self.state_scroll.set_current_value(target)
+
+    def _set_up_state_scroll(self, value=0):
         self.state_scroll.kill()
-        self.state_scroll = pg_gui.elements.UIHorizontalSlider(relative_rect=pg.Rect((WIDTH - 220, 270), (200, 25)),
-                                                               start_value=0, value_range=(0, len(self.states) - 1),
+        self.state_scroll = pg_gui.elements.UIHorizontalSlider(relative_rect=pg.Rect((WIDTH - 220, 300), (200, 25)),
+                                                               start_value=value, value_range=(0, len(self.states) - 1),
                                                                manager=self.ui_manager,
                                                                object_id=pg_gui.core.ObjectID(class_id="@scroll",
                                                                                               object_id="#state_scroll"))
@@ -307,33 +564,71 @@ class Game:
 
     def add_node(self, node):
         self._default_state()
-        self.objects_group.add(node)
-        self.nodes_group.add(node)
+        self._add_nodes([node])
+
+    def _add_nodes(self, nodes):
+        self.objects_group.add(nodes)
+        self.nodes_group.add(nodes)
+        self.spatial.insert_many(nodes)
+        for node in nodes:
+            node.index = self.spatial
+            node.layout = self.layout
+            self.layout.add_node(node)
+            node.model = self.graph
+            self.graph.add_node(node.number)
+            node.numbers = self.numbers
+            self.numbers.reserve(int(node.number))
 
     def select_node(self, node: objects.Node):
         node.select()
         self.selected_nodes.append(node)
 
+    def _mouse_world(self) -> tuple:
+        x, y = self.camera.to_world(pg.mouse.get_pos())
+        return round(x), round(y)
+
+    def _nodes_at(self, pos) -> list:
+        return [obj for obj in self.spatial.query_point(pos) if isinstance(obj, objects.Node)]
+
     def _check_collisions(self):
-        for i, object1 in enumerate(list(self.objects_group)[:-1]):
-            for object2 in list(self.objects_group)[i + 1:]:
-                if object1.rect.colliderect(object2.rect):
-                    object1.collision(object2)
-                    object2.collision(object1)
+        # пары ищутся только среди классов, которые переопределяют collision
+        kinds = tuple(cls for cls in (objects.Node, objects.Edge) if cls.collision is not objects.Basic.collision)
+        if not kinds:
+            return
+        for object1, object2 in self.spatial.pairs(self.camera.world_rect, kinds):
+            object1.collision(object2)
+            object2.collision(object1)
 
     def _update_objects(self):
 
-        self._check_collisions()
+        with profiler.phase("collisions"):
+            self._check_collisions()
 
-        if self.checking_result:
-            self.set_state(self.states[self.state_scroll.current_value])
-            self.current_state = self.state_scroll.current_value
+        if self.playing:
+            self._step_playback()
 
-        for obj in self.objects_group:
-            obj.update()
+        if (self.checking_result and self.state_scroll.visible
+                and self.state_scroll.current_value != self.shown_state):
+            # трасса может ещё расти, а ползунок -- отставать от неё
+            current = min(self.state_scroll.current_value, len(self.states) - 1)
+            self.set_state(self.states[current])
+            self.current_state = self.shown_state = current
+
+        # обновляются только видимые спрайты, остальные догонят, когда попадут в кадр
+        with profiler.phase("sprites"):
+            for obj in self.spatial.query_rect(self.camera.world_rect):
+                obj.update()
 
         if self.mode == self.MOVE_NODE_MOD and self.moving_node:
-            self.moving_node.update(*pg.mouse.get_pos())
+            self.moving_node.update(*self._mouse_world())
+
+        if self.auto_layout is not None:
+            with profiler.phase("auto layout"):
+                self._step_layout()
+
+        # рёбра сдвинутых вершин и перекрашенные рёбра пересчитываются одним проходом
+        with profiler.phase("edge geometry"):
+            self.layout.refresh()
 
         if len(self.selected_nodes) == 2:  # набралось 2 выбранные вершины
             node1, node2 = self.selected_nodes
@@ -344,6 +639,53 @@ class Game:
             if node1 != node2:
                 self.add_edge(node1, node2, self.directed)
 
+    def start_layout(self):
+        nodes = list(self.nodes_group)
+        if len(nodes) < 2:
+            return
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = [(index[edge.node1], index[edge.node2]) for edge in self.edges_group]
+        self._default_state()
+        self.auto_layout = ForceLayout([node.rect.center for node in nodes], edges)
+        self._layout_nodes = nodes
+        self._layout_applied = time.perf_counter()
+        self.message = "Укладка..."
+
+    def _step_layout(self):
+        # итерации укладки идут, пока не кончится бюджет кадра, окно не замирает
+        layout = self.auto_layout
+        start = time.perf_counter()
+        while not layout.done and time.perf_counter() - start < self.LAYOUT_BUDGET:
+            layout.step()
+        self.message_time = f"Итерация {layout.iteration} из {layout.iterations} (Esc - остановить)"
+        if layout.done:
+            self.finish_layout()
+        elif start - self._layout_applied >= self.LAYOUT_APPLY_INTERVAL:
+            # спрайты двигаются реже, чем идут итерации: сдвиг тысяч вершин дороже шага
+            self._apply_layout()
+            self._layout_applied = start
+
+    def _apply_layout(self):
+        positions = self.auto_layout.positions
+        # координаты холста остаются положительными, левый верхний угол рамки -- на отступе
+        shift = self.LAYOUT_MARGIN - positions.min(axis=0)
+        for node, (x, y) in zip(self._layout_nodes, (positions + shift).round().astype(int).tolist()):
+            if node.alive():
+                node.update(x, y)
+        self._full_redraw = True
+
+    def finish_layout(self, cancelled=False):
+        self._apply_layout()
+        self.layout.refresh()
+        nodes = [node for node in self._layout_nodes if node.alive()]
+        if nodes:
+            self.camera.fit(nodes[0].rect.unionall([node.rect for node in nodes[1:]]),
+                            self.PANEL_RECT.left, HEIGHT)
+        self.message = "Укладка остановлена" if cancelled else "Укладка готова"
+        self.message_time = ""
+        self.auto_layout = None
+        self._layout_nodes = []
+
     def _default_objects(self):
         for obj in self.objects_group:
             obj.default()
@@ -355,57 +697,331 @@ class Game:
     def add_edge(self, node1: objects.Node, node2: objects.Node, directed: bool):
         if not node1.has_neighbour(node2):
             self._default_state()
-            edge = objects.Edge(node1, node2, directed)
-            node1.add_neighbour(node2, edge)
-            can_go = True
-            if directed:
-                can_go = False
-            node2.add_neighbour(node1, edge, can_go)
-            self.objects_group.add(edge)
-            self.edges_group.add(edge)
+            self._add_edges([self._create_edge(node1, node2, directed)])
+
+    def _create_edge(self, node1: objects.Node, node2: objects.Node, directed: bool) -> objects.Edge:
+        edge = objects.Edge(node1, node2, directed, self.layout)
+        node1.add_neighbour(node2, edge)
+        can_go = True
+        if directed:
+            can_go = False
+        node2.add_neighbour(node1, edge, can_go)
+        return edge
+
+    def _add_edges(self, edges):
+        self.objects_group.add(edges)
+        self.edges_group.add(edges)
+        # геометрия всех новых рёбер считается одним проходом, потом они попадают в индекс
+        self.layout.refresh()
+        self.spatial.insert_many(edges)
+        for edge in edges:
+            edge.index = self.spatial
+            edge.model = self.graph
+            self.graph.add_edge(edge.node1.number, edge.node2.number, edge.directed)
+
+    def graph_data(self) -> dict:
+        nodes = sorted(self.nodes_group, key=lambda node: int(node.number))
+        index = {node: i for i, node in enumerate(nodes)}
+        return storage.graph_data(self.directed, (int(node.number) for node in nodes),
+                                  (node.rect.centerx for node in nodes), (node.rect.centery for node in nodes),
+                                  (index[node] for edge in self.edges_group for node in (edge.node1, edge.node2)))
+
+    def set_graph_data(self, data: dict):
+        # десятки тысяч новых объектов без циклов: сборщик мусора на это время не нужен,
+        # иначе он много раз обходит все уже созданные спрайты
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._set_graph_data(data)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _set_graph_data(self, data: dict):
+        # все спрайты создаются пачкой, без сброса состояния на каждой вершине и дуге
+        self.clear()
+        if self.directed != data["directed"]:
+            self.directed = data["directed"]
+            self.graph.set_directed(self.directed)
+            self._set_up_edge_type_drop_down()
+        nodes = [objects.Node(x, y, number) for number, x, y in zip(data["numbers"], data["xs"], data["ys"])]
+        self._add_nodes(nodes)
+        edges = []
+        pairs = data["edges"]
+        for i in range(0, len(pairs), 2):
+            node1, node2 = nodes[pairs[i]], nodes[pairs[i + 1]]
+            if node1 is not node2 and not node1.has_neighbour(node2):
+                edges.append(self._create_edge(node1, node2, self.directed))
+        self._add_edges(edges)
+        self._full_redraw = True
+
+    def save(self, path):
+        try:
+            storage.save(path, self.graph_data())
+        except OSError as e:
+            self.message = f"Не удалось сохранить: {e.strerror}"
+            return
+        self.message = f"Граф сохранён в {path}"
+
+    def load(self, path):
+        try:
+            data = storage.load(path)
+        except (OSError, ValueError):
+            self.message = f"Не удалось загрузить {path}"
+            return
+        self.set_graph_data(data)
+        self.message = f"Загружен {path}: вершин {len(data['numbers'])}, дуг {len(self.edges_group)}"
 
     def _render_objects(self):
-        self.objects_group.draw(self.screen)
+        panel = (self.mode, self.message, self.message_time, self.camera.zoom, self._playback_text())
+        if panel != self._drawn_panel or time.perf_counter() < self._ui_active_until:
+            self._panel_dirty = True
+            self._drawn_panel = panel
+
+        # рисуются только спрайты, попавшие в кадр, в координатах экрана
+        views = [(obj, self._screen_rect(obj)) for obj in self.spatial.query_rect(self.camera.world_rect)]
+        rects = None
+        if not self._full_redraw:
+            with profiler.phase("dirty rects"):
+                rects = self._merge_rects(self._dirty_rects(views))
+                screen = self.screen.get_rect()
+                area = sum(rect.clip(screen).width * rect.clip(screen).height for rect in rects)
+                if len(rects) > self.MAX_DIRTY_RECTS or area > self.MAX_DIRTY_SHARE * screen.width * screen.height:
+                    rects = None
+        if rects is None:
+            with profiler.phase("draw"):
+                self.screen.fill(SCREEN_COLOR)
+                for obj, rect in views:
+                    self._draw_object(obj, rect)
+                self._render_panel()
+                if profiler.enabled:
+                    self._render_overlay()
+            with profiler.phase("flip"):
+                pg.display.flip()
+        else:
+            with profiler.phase("draw"):
+                if self._panel_dirty:
+                    rects.append(self.PANEL_RECT)
+                if profiler.enabled:
+                    rects.append(self.OVERLAY_RECT)
+                rects = self._merge_rects(rects)
+                if rects:
+                    self._redraw_rects(rects, views)
+                    if self._panel_dirty:
+                        self._render_panel()
+                    if profiler.enabled:
+                        self._render_overlay()
+            if rects:
+                with profiler.phase("flip"):
+                    pg.display.update(rects)
+
+        self._full_redraw = False
+        self._panel_dirty = False
+        self._drawn = {obj: (rect, self._look(obj)) for obj, rect in views}
+
+    def _screen_rect(self, obj) -> pg.Rect:
+        rect = self.camera.screen_rect(obj.rect)
+        # при масштабе округление и упрощённая отрисовка могут выйти за рамку на пиксель
+        return rect if self.camera.zoom == 1 else rect.inflate(2, 2)
+
+    @staticmethod
+    def _look(obj):
+        # новая картинка (у длинных рёбер -- новая геометрия) значит, что спрайт перерисован
+        return obj.image if obj.image is not None else obj.shape
+
+    def _draw_object(self, obj, rect):
+        zoom = self.camera.zoom
+        if obj.image is None and zoom >= self.DETAIL_ZOOM:
+            # длинное ребро без своей поверхности рисуется прямо на экран
+            obj.draw(self.screen, self.camera.offset, zoom)
+        elif zoom == 1:
+            self.screen.blit(obj.image, rect)
+        elif zoom >= self.DETAIL_ZOOM:
+            self.screen.blit(self._scaled_image(obj.image, rect.inflate(-2, -2).size), rect.inflate(-2, -2))
+        elif isinstance(obj, objects.Edge):
+            line_start, line_end = obj.line()
+            pg.draw.line(self.screen, obj.color, self.camera.to_screen(line_start), self.camera.to_screen(line_end))
+        else:
+            center = self.camera.to_screen(obj.rect.center)
+            if zoom < self.POINT_ZOOM:
+                color = obj.NUMBER_COLOR if obj.color == obj.MAIN_COLOR else obj.color
+                pg.draw.circle(self.screen, color, center, 2)
+            else:
+                radius = obj.RADIUS * zoom
+                pg.draw.circle(self.screen, obj.color, center, radius)
+                pg.draw.circle(self.screen, obj.NUMBER_COLOR, center, radius, 1)
+
+    def _scaled_image(self, image, size) -> pg.Surface:
+        key = (image, size)
+        scaled = self._scaled.get(key)
+        if scaled is None:
+            if len(self._scaled) >= self.SCALED_CACHE_SIZE:
+                self._scaled.clear()
+            scaled = self._scaled[key] = pg.transform.smoothscale(image, size)
+        return scaled
+
+    def _dirty_rects(self, views) -> list:
+        # области спрайтов, которые сдвинулись, перерисовались, появились или исчезли
+        rects = []
+        drawn = self._drawn
+        for obj, rect in views:
+            old = drawn.pop(obj, None)
+            if old is None:
+                rects.append(rect)
+            elif old[1] is not self._look(obj) or old[0] != rect:
+                rects.append(old[0])
+                rects.append(rect)
+        for rect, _ in drawn.values():
+            rects.append(rect)
+        return rects
+
+    @staticmethod
+    def _merge_rects(rects) -> list:
+        # пересекающиеся области сливаются в общую рамку, пока пересечения есть
+        merged = []
+        for rect in rects:
+            rect = pg.Rect(rect)
+            i = rect.collidelist(merged)
+            while i != -1:
+                rect.union_ip(merged.pop(i))
+                i = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def _redraw_rects(self, rects, views):
+        # области не пересекаются: сначала все очищаются, затем каждый спрайт
+        # рисуется по одному разу в каждой задетой им области
+        for rect in rects:
+            self.screen.fill(SCREEN_COLOR, rect)
+        for obj, obj_rect in views:
+            for i in obj_rect.collidelistall(rects):
+                self.screen.set_clip(rects[i])
+                self._draw_object(obj, obj_rect)
+        self.screen.set_clip(None)
+
+    def _render_panel(self):
         self.ui_manager.draw_ui(self.screen)
         self._print_mode()
         self._print_message()
 
     def _print_mode(self):
-        font = pg.font.SysFont("arial", 12)
+        font = get_font(12)
         color = pg.Color("#44455B")
-        text_mode = font.render(f"Режим: {self.MODES[self.mode]}", True, color)
+        text = f"Режим: {self.MODES[self.mode]}"
+        if self.camera.zoom != 1:
+            text += f", масштаб {self.camera.zoom:.0%}"
+        text_mode = font.render(text, True, color)
         self.screen.blit(text_mode, (WIDTH - 220, 10))
 
     def _print_message(self):
-        font = pg.font.SysFont("arial", 12)
+        font = get_font(12)
         color = pg.Color("#44455B")
         text_message = font.render(self.message, True, color)
         text_time = font.render(self.message_time, True, color)
-        self.screen.blit(text_message, (WIDTH - 220, 300))
-        self.screen.blit(text_time, (WIDTH - 220, 320))
+        text_playback = font.render(self._playback_text(), True, color)
+        self.screen.blit(text_message, (WIDTH - 220, 330))
+        self.screen.blit(text_time, (WIDTH - 220, 350))
+        self.screen.blit(text_playback, (WIDTH - 220, 370))
+
+    def _playback_text(self) -> str:
+        if not self.checking_result or len(self.states) < 2:
+            return ""
+        text = f"Шаг {self.current_state + 1} из {len(self.states)}"
+        return text + (f", {self.playback_rate} шаг/с" if self.playing else ", пауза")
+
+    def toggle_profiler(self):
+        profiler.enabled = not profiler.enabled
+        if profiler.enabled:
+            profiler.clear()
+            self._overlay = None
+        else:
+            self._full_redraw = True
+
+    def export_profile(self):
+        name = time.strftime("profile-%Y%m%d-%H%M%S")
+        profiler.export_csv(name + ".csv")
+        profiler.export_chrome_trace(name + ".json")
+        self.message = f"Профиль: {name}.csv, {name}.json"
+
+    def _render_overlay(self):
+        now = time.perf_counter()
+        if self._overlay is None or now >= self._overlay_time + self.OVERLAY_INTERVAL:
+            self._overlay = self._overlay_surface()
+            self._overlay_time = now
+        self.screen.blit(self._overlay, self.OVERLAY_RECT)
+
+    def _overlay_surface(self) -> pg.Surface:
+        lines = [f"FPS: {self.clock.get_fps():.0f}"]
+        percentiles = profiler.frame_percentiles()
+        if percentiles:
+            lines.append("Кадр p50/p95/p99: " + " / ".join(f"{t * 1000:.1f}" for t in percentiles.values()) + " мс")
+        for name, duration in sorted(profiler.phase_means().items(), key=lambda item: -item[1]):
+            lines.append(f"  {name}: {duration * 1000:.2f} мс")
+        background = profiler.background()
+        if background:
+            lines.append("Последний поиск:")
+            for name, duration in background.items():
+                lines.append(f"  {name}: {duration * 1000:.1f} мс")
+        lines.append("F3 - скрыть, F4 - сохранить профиль")
+
+        surface = pg.Surface(self.OVERLAY_RECT.size, pg.SRCALPHA)
+        surface.fill((255, 255, 255, 220))
+        font = get_font(12)
+        color = pg.Color("#44455B")
+        for i, line in enumerate(lines):
+            surface.blit(font.render(line, True, color), (6, 4 + i * 16))
+        return surface
+
+    def _is_idle(self) -> bool:
+        return (self.worker is None and self.moving_node is None and self.auto_layout is None and not self.playing
+                and not self._full_redraw
+                and time.perf_counter() >= self._ui_active_until and not any(pg.mouse.get_pressed()))
+
+    def _get_events(self) -> list:
+        if not self._is_idle():
+            return pg.event.get()
+        # ничего не происходит -- ждём событие, не нагружая процессор
+        events = [pg.event.wait()]
+        self.clock.tick()
+        return events + pg.event.get()
 
     def run(self):
         self.running = True
         while self.running:
             time_delta = self.clock.tick(FPS) / 1000
 
-            self._default_objects()
+            events = self._get_events()
+            if events:
+                self._ui_active_until = time.perf_counter() + self.UI_SETTLE_TIME
 
-            self.check_events()
+            profiler.begin_frame()
 
-            self._update_objects()
+            with profiler.phase("events"):
+                self.check_events(events)
+
+            self._check_worker()
 
-            self.screen.fill(SCREEN_COLOR)
+            self._update_objects()
 
-            self.ui_manager.update(time_delta)
+            with profiler.phase("ui update"):
+                self.ui_manager.update(time_delta)
 
             self._render_objects()
 
-            pg.display.flip()
+            profiler.end_frame()
 
+        self.cache.close()
         pg.quit()
 
 
 if __name__ == '__main__':
-    game = Game()
+    parser = argparse.ArgumentParser(description="Graph editor")
+    parser.add_argument("path", nargs="?", help="graph file to open (.json or binary)")
+    parser.add_argument("--cache", nargs="?", const=user_cache_path(), default=None, metavar="PATH",
+                        help="keep Hamiltonian results in this SQLite file between sessions "
+                             "(without PATH -- in the user cache directory)")
+    args = parser.parse_args()
+    game = Game(args.path, args.cache)
+    if args.path:
+        game.load(game.path)
     game.run()
@@ -1,7 +1,12 @@
+import functools
 import math
 import pygame_gui as pg_gui
 
 from consts import *
+from fonts import get_font
+from spatial import segment_cells
+
+NODE_CACHE_SIZE = 1024
 
 
 def distance(v1, v2):
@@ -13,6 +18,10 @@ class Basic(pg.sprite.Sprite):
     WIDTH, HEIGHT = 64, 64
     COLOR = (0, 0, 0)
 
+    index = None
+    model = None
+    layout = None
+
     def __init__(self, x, y):
         pg.sprite.Sprite.__init__(self)
 
@@ -36,17 +45,37 @@ class Basic(pg.sprite.Sprite):
     def collision(self, obj):
         pass
 
+    def _moved(self):
+        if self.index is not None:
+            self.index.update(self)
+
     def destroy(self):
+        if self.index is not None:
+            self.index.remove(self)
         self.kill()
 
 
+@functools.lru_cache(maxsize=NODE_CACHE_SIZE)
+def _render_node(number, color, selected) -> pg.Surface:
+    image = pg.Surface([Node.WIDTH, Node.HEIGHT], pg.SRCALPHA)
+    center = Node.WIDTH // 2
+    pg.draw.circle(image, Node.BORDER_COLOR, (center, center), Node.RADIUS)
+    pg.draw.circle(image, color, (center, center), (Node.WIDTH - 10) // 2)
+    text_number = get_font(36).render(number, True, Node.NUMBER_COLOR)
+    image.blit(text_number, (18, 14))
+    return image
+
+
 class Node(Basic):
     WIDTH, HEIGHT = 64, 64
     MAIN_COLOR = pg.Color("#FFFFFF")
     BORDER_COLOR = pg.Color("#D9D7D7")
     SELECTED_COLOR = pg.Color("#F0F0F0")
+    NUMBER_COLOR = pg.Color("#658EA9")
     RADIUS = WIDTH // 2 - 2
 
+    numbers = None
+
     def __init__(self, x, y, number):
         self.number = str(number)
 
@@ -54,6 +83,7 @@ class Node(Basic):
         self.edges = dict()
         self.color = self.MAIN_COLOR
         self.selected = False
+        self.image_key = None
         super().__init__(x, y)
 
     def default(self):
@@ -61,11 +91,9 @@ class Node(Basic):
             self.color = self.MAIN_COLOR
 
     def _render_image(self) -> pg.Surface:
-        image = self._get_image()
-        center = self.WIDTH // 2
-        pg.draw.circle(image, self.BORDER_COLOR, (center, center), self.RADIUS)
-        pg.draw.circle(image, self.color, (center, center), (self.WIDTH - 10) // 2)
-        return image
+        # изображения с одинаковыми номером и цветом общие для всех вершин
+        self.image_key = (self.number, tuple(self.color), self.selected)
+        return _render_node(*self.image_key)
 
     def select(self):
         self.color = self.SELECTED_COLOR
@@ -90,28 +118,39 @@ class Node(Basic):
             self.edges.pop(node)
 
     def update(self, x=None, y=None):
-        if x and y:
+        if x and y and (self.rect.x, self.rect.y) != (x - self.WIDTH // 2, y - self.HEIGHT // 2):
             self.rect.x, self.rect.y = x - self.WIDTH // 2, y - self.HEIGHT // 2
             self.pos = pg.math.Vector2(self.rect.x, self.rect.y)
-        self.image = self._render_image()
-        font_optima = pg.font.SysFont("arial", 36)
-        color = pg.Color("#658EA9")
-        text_number = font_optima.render(self.number, True, color)
-        self.image.blit(text_number, (18, 14))
+            self._moved()
+            if self.layout is not None:
+                self.layout.moved(self)
+        if self.image_key != (self.number, tuple(self.color), self.selected):
+            self.image = self._render_image()
 
     def destroy(self):
         for neighbour in self.neighbours.copy():
             self.edges[neighbour][0].destroy()
         self.neighbours.clear()
-        self.kill()
+        if self.model is not None:
+            self.model.remove_node(self.number)
+        if self.numbers is not None:
+            self.numbers.release(int(self.number))
+        if self.layout is not None:
+            self.layout.remove_node(self)
+        super().destroy()
 
 
 class Edge(Basic):
     WIDTH = WIDTH
     HEIGHT = HEIGHT
     COLOR = pg.Color("#4E4F50")
+    LINE_WIDTH = 3
+    ARROW_RADIUS = 5
+    # поверхность по рамке ребра растёт как квадрат его длины, поэтому кэшируются
+    # только короткие рёбра (до 16 КБ), остальные рисуются прямо на экран
+    MAX_IMAGE_AREA = 4096
 
-    def __init__(self, node1: Node, node2: Node, directed=False):
+    def __init__(self, node1: Node, node2: Node, directed=False, layout=None):
         self.node1 = node1
         self.node2 = node2
         self.directed = directed
@@ -121,15 +160,38 @@ class Edge(Basic):
         self.current_node2 = node2
         self.current_directed = directed
 
+        self.geometry_key = None
+
         pg.sprite.Sprite.__init__(self)
 
-        self.image = pg.Surface([self.WIDTH, self.HEIGHT], pg.SRCALPHA)
+        # с layout геометрия появится при его refresh() -- сразу для всей пачки рёбер
+        if layout is not None:
+            self.attach(layout)
+        else:
+            self.update()
+
+    def _layout_key(self) -> tuple:
+        return self.current_node1, self.current_node2, tuple(self.color), self.current_directed
 
-        self._draw_arrow(node1, node2, directed)
+    def attach(self, layout):
+        # дальше геометрию пересчитывает layout, сдвиги вершин он узнаёт от них самих
+        self.layout = layout
+        self.geometry_key = self._layout_key()
+        layout.invalidate(self)
 
     def update(self):
-        self.image = pg.Surface([self.WIDTH, self.HEIGHT], pg.SRCALPHA)
-        self._draw_arrow(self.current_node1, self.current_node2, self.current_directed)
+        if self.layout is not None:
+            key = self._layout_key()
+            if key != self.geometry_key:
+                self.geometry_key = key
+                self.layout.invalidate(self)
+            return
+        # перерисовываем только если сдвинулась вершина, поменялся цвет или направление
+        key = (tuple(self.current_node1.pos), tuple(self.current_node2.pos), tuple(self.color),
+               self.current_directed)
+        if key != self.geometry_key:
+            self.geometry_key = key
+            self._draw_arrow(self.current_node1, self.current_node2, self.current_directed)
 
     def default(self):
         self.color = self.COLOR
@@ -142,31 +204,76 @@ class Edge(Basic):
         self.current_node2 = end
         self.current_directed = True
 
-    def _draw_arrow(self, start: Node, end: Node, directed=False):
-        if directed:
-            triangle_rad = 5
-        else:
-            triangle_rad = 0
+    def line(self) -> tuple:
+        line_start, line_end, _ = self._arrow_geometry(self.current_node1, self.current_node2)
+        return line_start, line_end
+
+    @staticmethod
+    def _arrow_geometry(start: Node, end: Node, directed=False) -> tuple:
         start_v, end_v = start.pos + pg.Vector2(1, 1) * start.RADIUS, end.pos + pg.Vector2(1, 1) * end.RADIUS
-        r = start.RADIUS
         v = end_v - start_v
-        v = v.normalize()
-        start = start_v + v * start.RADIUS
-        end = end_v - v * end.RADIUS
-        rect_line = pg.draw.line(self.image, self.color, start, end, 3)
-        rotation = math.degrees(math.atan2(start.y - end.y, end.x - start.x)) + 90
-        rect_polygon = pg.draw.polygon(self.image, self.color, (
-            (end.x + triangle_rad * math.sin(math.radians(rotation)),
-             end.y + triangle_rad * math.cos(math.radians(rotation))), (
-                end.x + triangle_rad * math.sin(math.radians(rotation - 120)),
-                end.y + triangle_rad * math.cos(math.radians(rotation - 120))), (
-                end.x + triangle_rad * math.sin(math.radians(rotation + 120)),
-                end.y + triangle_rad * math.cos(math.radians(rotation + 120)))))
-        rect = rect_line.union(rect_polygon)
-        self.image = self.image.subsurface(rect)
-        self.rect = rect
+        if v.length_squared() > 0:
+            v = v.normalize()
+        line_start = start_v + v * start.RADIUS
+        line_end = end_v - v * end.RADIUS
+        if not directed:
+            return line_start, line_end, ()
+        rotation = math.degrees(math.atan2(line_start.y - line_end.y, line_end.x - line_start.x)) + 90
+        triangle = tuple(
+            pg.Vector2(line_end.x + Edge.ARROW_RADIUS * math.sin(math.radians(rotation + angle)),
+                       line_end.y + Edge.ARROW_RADIUS * math.cos(math.radians(rotation + angle)))
+            for angle in (0, -120, 120))
+        return line_start, line_end, triangle
+
+    def _draw_arrow(self, start: Node, end: Node, directed=False):
+        line_start, line_end, triangle = self._arrow_geometry(start, end, directed)
+        points = (line_start, line_end) + triangle
+        left = math.floor(min(p.x for p in points)) - self.LINE_WIDTH
+        top = math.floor(min(p.y for p in points)) - self.LINE_WIDTH
+        right = math.ceil(max(p.x for p in points)) + self.LINE_WIDTH
+        bottom = math.ceil(max(p.y for p in points)) + self.LINE_WIDTH
+        self.render((left, top, right - left, bottom - top), line_start, line_end, triangle)
+
+    def render(self, box, line_start, line_end, triangle):
+        # точки -- любые пары координат: Vector2 отсюда или строки массивов из EdgeLayout
+        self.rect = pg.Rect(box)
+        self.shape = (tuple(line_start), tuple(line_end), [tuple(p) for p in triangle])
+        self._image = None
+        self._image_ready = self.rect.width * self.rect.height > self.MAX_IMAGE_AREA
+        self._moved()
+
+    @property
+    def image(self):
+        # поверхность рисуется при первом обращении, то есть только для рёбер на экране
+        if not self._image_ready:
+            self._image = pg.Surface(self.rect.size, pg.SRCALPHA)
+            self.draw(self._image, self.rect.topleft)
+            self._image_ready = True
+        return self._image
+
+    def cells(self, size) -> list:
+        # клетки индекса вдоль отрезка и под вершинами стрелки, а не вся рамка ребра;
+        # клетки могут повторяться
+        line_start, line_end, triangle = self.shape
+        cells = segment_cells(line_start, line_end, size)
+        cells.extend((math.floor(x / size), math.floor(y / size)) for x, y in triangle)
+        return cells
+
+    def draw(self, surface, offset=(0, 0), scale=1):
+        # точка холста p рисуется на surface в (p - offset) * scale
+        left, top = offset
+        line_start, line_end, triangle = self.shape
+        pg.draw.line(surface, self.color, ((line_start[0] - left) * scale, (line_start[1] - top) * scale),
+                     ((line_end[0] - left) * scale, (line_end[1] - top) * scale),
+                     max(1, round(self.LINE_WIDTH * scale)))
+        if triangle:
+            pg.draw.polygon(surface, self.color, [((x - left) * scale, (y - top) * scale) for x, y in triangle])
 
     def destroy(self):
+        if self.layout is not None:
+            self.layout.remove_edge(self)
         self.node1.remove_neighbour(self.node2)
         self.node2.remove_neighbour(self.node1)
-        self.kill()
+        if self.model is not None:
+            self.model.remove_edge(self.node1.number, self.node2.number)
+        super().destroy()
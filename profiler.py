@@ -0,0 +1,141 @@
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+
+class _Phase:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class _NullPhase:
+    start = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Profiler:
+    """Замеры фаз кадра и фоновых вычислений.
+
+    Фазы главного потока складываются в текущий кадр, фазы других потоков
+    (поиск в AlgorithmWorker) -- в totals. Последние кадры и события хранятся
+    в кольцевых буферах. Пока enabled выключен, phase() ничего не измеряет.
+    """
+
+    def __init__(self, frames=600, events=50000):
+        self.enabled = False
+        self.frames = deque(maxlen=frames)
+        self.events = deque(maxlen=events)
+        self.totals = dict()
+        self.last = dict()
+        self._origin = time.perf_counter()
+        self._main = threading.get_ident()
+        self._frame_start = None
+        self._frame_phases = dict()
+        self._lock = threading.Lock()
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def add(self, name, start, duration):
+        if not self.enabled:
+            return
+        thread = threading.get_ident()
+        self.events.append((name, thread, start, duration))
+        if thread == self._main:
+            if self._frame_start is not None:
+                self._frame_phases[name] = self._frame_phases.get(name, 0) + duration
+            return
+        with self._lock:
+            count, total = self.totals.get(name, (0, 0))
+            self.totals[name] = (count + 1, total + duration)
+            self.last[name] = duration
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self._frame_start = time.perf_counter()
+        self._frame_phases = dict()
+
+    def end_frame(self):
+        if not self.enabled or self._frame_start is None:
+            return
+        duration = time.perf_counter() - self._frame_start
+        self.frames.append((self._frame_start, duration, self._frame_phases))
+        self.events.append(("frame", self._main, self._frame_start, duration))
+        self._frame_start = None
+
+    def clear(self):
+        self.frames.clear()
+        self.events.clear()
+        with self._lock:
+            self.totals.clear()
+            self.last.clear()
+
+    def frame_percentiles(self, percents=(50, 95, 99)) -> dict:
+        times = sorted(frame[1] for frame in self.frames)
+        if not times:
+            return dict()
+        return {p: times[min(len(times) - 1, len(times) * p // 100)] for p in percents}
+
+    def phase_means(self) -> dict:
+        # среднее время фазы на кадр по всему буферу кадров
+        frames = list(self.frames)
+        res = dict()
+        for _, _, phases in frames:
+            for name, duration in phases.items():
+                res[name] = res.get(name, 0) + duration
+        return {name: total / len(frames) for name, total in res.items()}
+
+    def background(self) -> dict:
+        with self._lock:
+            return dict(self.last)
+
+    def phase_names(self) -> list:
+        names = dict()
+        for _, _, phases in list(self.frames):
+            names.update(dict.fromkeys(phases))
+        return list(names)
+
+    def export_csv(self, path):
+        names = self.phase_names()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", "start_ms", "total_ms"] + [f"{name}_ms" for name in names])
+            for i, (start, duration, phases) in enumerate(list(self.frames)):
+                writer.writerow([i, round((start - self._origin) * 1000, 3), round(duration * 1000, 3)] +
+                                [round(phases.get(name, 0) * 1000, 3) for name in names])
+
+    def export_chrome_trace(self, path):
+        # формат chrome://tracing и Perfetto: полные события "X" с временем в микросекундах
+        events = []
+        for name, thread, start, duration in list(self.events):
+            events.append({"name": name, "ph": "X", "pid": 0, "tid": thread,
+                           "ts": round((start - self._origin) * 1e6, 1), "dur": round(duration * 1e6, 1)})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+profiler = Profiler()
@@ -0,0 +1,27 @@
+import threading
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Progress:
+    """Счётчики хода поиска и флаг отмены, общие для решателя и интерфейса."""
+
+    def __init__(self):
+        self.steps = 0
+        self.masks = 0
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def advance(self, steps=0, masks=0):
+        self.steps += steps
+        self.masks += masks
+        if self._cancelled.is_set():
+            raise Cancelled()
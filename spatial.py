@@ -0,0 +1,173 @@
+import itertools
+import math
+
+
+def segment_cells(start, end, size) -> list:
+    """Клетки сетки, через которые проходит отрезок (обход Амэнатидеса -- By)."""
+    x0, y0 = start
+    x1, y1 = end
+    cx, cy = math.floor(x0 / size), math.floor(y0 / size)
+    ex, ey = math.floor(x1 / size), math.floor(y1 / size)
+    dx, dy = x1 - x0, y1 - y0
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    # t -- доля пути по отрезку до следующей вертикальной и горизонтальной границы
+    t_x = ((cx + (step_x > 0)) * size - x0) / dx if dx else math.inf
+    t_y = ((cy + (step_y > 0)) * size - y0) / dy if dy else math.inf
+    dt_x = size / abs(dx) if dx else math.inf
+    dt_y = size / abs(dy) if dy else math.inf
+    cells = [(cx, cy)]
+    # число шагов известно заранее, поэтому ошибки округления не зациклят обход
+    for _ in range(abs(ex - cx) + abs(ey - cy)):
+        if t_x < t_y:
+            cx += step_x
+            t_x += dt_x
+        else:
+            cy += step_y
+            t_y += dt_y
+        cells.append((cx, cy))
+    return cells
+
+
+class SpatialHash:
+    """Равномерная сетка из клеток cell_size x cell_size для поиска объектов по rect.
+
+    Объект хранится в клетках, которые пересекает его rect, а объект с методом
+    cells(cell_size) (ребро) -- только в клетках, которые он возвращает, то есть
+    вдоль отрезка, а не по всей рамке. Поиск по точке смотрит одну клетку, а
+    проверка столкновений -- только пары объектов из общих клеток.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = dict()
+        self._objects = dict()
+        self._counter = itertools.count()
+
+    def _cell_range(self, rect) -> tuple:
+        size = self.cell_size
+        right, bottom = max(rect.left, rect.right - 1), max(rect.top, rect.bottom - 1)
+        return rect.left // size, rect.top // size, right // size, bottom // size
+
+    def _cells(self, cell_range):
+        x0, y0, x1, y1 = cell_range
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield x, y
+
+    def __contains__(self, obj):
+        return obj in self._objects
+
+    def __len__(self):
+        return len(self._objects)
+
+    def _object_cells(self, obj) -> frozenset:
+        if hasattr(obj, "cells"):
+            return frozenset(obj.cells(self.cell_size))
+        return frozenset(self._cells(self._cell_range(obj.rect)))
+
+    def insert(self, obj):
+        if obj in self._objects:
+            self.update(obj)
+            return
+        cells = self._object_cells(obj)
+        self._objects[obj] = (next(self._counter), cells)
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(obj)
+
+    def insert_many(self, objs):
+        # то же, что insert для каждого объекта, но без поиска атрибутов на каждом шаге
+        buckets = self.cells
+        objects = self._objects
+        for obj in objs:
+            if obj in objects:
+                self.update(obj)
+                continue
+            cells = self._object_cells(obj)
+            objects[obj] = (next(self._counter), cells)
+            for cell in cells:
+                bucket = buckets.get(cell)
+                if bucket is None:
+                    buckets[cell] = {obj}
+                else:
+                    bucket.add(obj)
+
+    def remove(self, obj):
+        if obj not in self._objects:
+            return
+        _, cells = self._objects.pop(obj)
+        for cell in cells:
+            bucket = self.cells[cell]
+            bucket.discard(obj)
+            if not bucket:
+                del self.cells[cell]
+
+    def update(self, obj):
+        if obj not in self._objects:
+            return
+        order, old_cells = self._objects[obj]
+        new_cells = self._object_cells(obj)
+        if new_cells == old_cells:
+            return
+        for cell in old_cells - new_cells:
+            bucket = self.cells[cell]
+            bucket.discard(obj)
+            if not bucket:
+                del self.cells[cell]
+        for cell in new_cells - old_cells:
+            self.cells.setdefault(cell, set()).add(obj)
+        self._objects[obj] = (order, new_cells)
+
+    def _sorted(self, objs) -> list:
+        # в порядке добавления, как при переборе группы спрайтов
+        return sorted(objs, key=lambda obj: self._objects[obj][0])
+
+    def query_point(self, pos) -> list:
+        x, y = pos
+        bucket = self.cells.get((int(x) // self.cell_size, int(y) // self.cell_size), ())
+        return self._sorted(obj for obj in bucket if obj.rect.collidepoint(x, y))
+
+    def _buckets(self, rect):
+        # пары (клетка, объекты в ней) для клеток, которые задевает rect
+        if rect is None:
+            return self.cells.items()
+        cell_range = self._cell_range(rect)
+        x0, y0, x1, y1 = cell_range
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self.cells):
+            return ((cell, self.cells[cell]) for cell in self._cells(cell_range) if cell in self.cells)
+        # прямоугольник больше занятой части сетки: быстрее пройти по занятым клеткам
+        return (((x, y), bucket) for (x, y), bucket in self.cells.items() if x0 <= x <= x1 and y0 <= y <= y1)
+
+    def query_rect(self, rect) -> list:
+        found = set()
+        for _, bucket in self._buckets(rect):
+            found.update(bucket)
+        return self._sorted(obj for obj in found if obj.rect.colliderect(rect))
+
+    def _owner(self, obj1, obj2, cell) -> bool:
+        # пара относится к одной клетке: той, где левый верхний угол пересечения
+        # рамок, если она общая, иначе к наименьшей общей клетке
+        size = self.cell_size
+        corner = (max(obj1.rect.left, obj2.rect.left) // size, max(obj1.rect.top, obj2.rect.top) // size)
+        cells1, cells2 = self._objects[obj1][1], self._objects[obj2][1]
+        if corner in cells1 and corner in cells2:
+            return corner == cell
+        return min(cells1 & cells2) == cell
+
+    def pairs(self, rect=None, kinds=None) -> list:
+        """Пары пересекающихся объектов, каждая один раз; kinds -- кортеж классов.
+
+        rect ограничивает поиск клетками, которые он задевает.
+        """
+        res = []
+        for cell, bucket in self._buckets(rect):
+            if kinds is not None:
+                bucket = [obj for obj in bucket if isinstance(obj, kinds)]
+            if len(bucket) < 2:
+                continue
+            for obj1, obj2 in itertools.combinations(bucket, 2):
+                if obj1.rect.colliderect(obj2.rect) and self._owner(obj1, obj2, cell):
+                    if self._objects[obj1][0] > self._objects[obj2][0]:
+                        obj1, obj2 = obj2, obj1
+                    res.append((obj1, obj2))
+        return res
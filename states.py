@@ -0,0 +1,223 @@
+import time
+from bisect import bisect_right
+from collections import deque
+
+from profiler import profiler
+
+SET_KEYS = ("yellow_nodes", "red_nodes", "red_edges", "green_edges")
+PATH_KEY = "green_nodes"
+
+ADD, DISCARD, CLEAR, APPEND, APPENDLEFT, POP = range(6)
+
+
+def _empty_state() -> dict:
+    state = {key: set() for key in SET_KEYS}
+    state[PATH_KEY] = deque()
+    return state
+
+
+def _apply(state: dict, op: tuple) -> bool:
+    code, key, item = op
+    container = state[key]
+    if code == ADD:
+        if item in container:
+            return False
+        container.add(item)
+    elif code == DISCARD:
+        if item not in container:
+            return False
+        container.remove(item)
+    elif code == CLEAR:
+        if not container:
+            return False
+        container.clear()
+    elif code == APPEND:
+        container.append(item)
+    elif code == APPENDLEFT:
+        container.appendleft(item)
+    elif code == POP:
+        if not container:
+            return False
+        container.pop()
+    return True
+
+
+class Trace:
+    """Последовательность состояний алгоритма.
+
+    Хранит для каждого шага только изменения относительно предыдущего и полные
+    снимки состояния (checkpoints). Снимок делается, когда с прошлого снимка
+    накопилось не меньше max(CHECKPOINT_INTERVAL, размер состояния) изменений,
+    поэтому память линейна по числу изменений, а восстановление любого шага
+    требует не больше такого же числа операций.
+
+    Пока решатель пишет трассу в своём потоке, интерфейс может читать уже
+    записанные шаги: len() растёт только после того, как шаг полностью сохранён.
+    """
+
+    CHECKPOINT_INTERVAL = 64
+    recording = True
+
+    def __init__(self, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.checkpoint_interval = checkpoint_interval
+        self._state = _empty_state()
+        self._size = 0
+        self._pending = []
+        self._deltas = []
+        self._checkpoint_steps = []
+        self._checkpoints = []
+        self._ops_since_checkpoint = 0
+        self._cursor = None
+        self._cursor_step = -1
+        self._length = 0
+        self.closed = False
+        # почему результата нет, если это выяснилось без перебора
+        self.reason = None
+        self.record_time = 0
+
+        # при включённом профайлере запись каждого изменения ещё и замеряется
+        if profiler.enabled and self.recording:
+            self._record = self._timed_record
+            self.commit = self._timed_commit
+
+        self._deltas.append(())
+        self._checkpoint()
+        self._length = 1
+
+    def _record(self, code, key, item=None):
+        container = self._state[key]
+        before = len(container)
+        if _apply(self._state, (code, key, item)):
+            self._pending.append((code, key, item))
+            self._size += len(container) - before
+
+    def _timed_record(self, code, key, item=None):
+        start = time.perf_counter()
+        Trace._record(self, code, key, item)
+        self.record_time += time.perf_counter() - start
+
+    def add(self, key, item):
+        self._record(ADD, key, item)
+
+    def discard(self, key, item):
+        self._record(DISCARD, key, item)
+
+    def clear(self, key):
+        if key == PATH_KEY:
+            while self._state[PATH_KEY]:
+                self.pop_path()
+        else:
+            self._record(CLEAR, key)
+
+    def append_path(self, node):
+        self._record(APPEND, PATH_KEY, node)
+
+    def appendleft_path(self, node):
+        self._record(APPENDLEFT, PATH_KEY, node)
+
+    def pop_path(self):
+        self._record(POP, PATH_KEY)
+
+    def set_path(self, nodes):
+        self.clear(PATH_KEY)
+        for node in nodes:
+            self.append_path(node)
+
+    def commit(self) -> bool:
+        if not self._pending:
+            return False
+        self._deltas.append(tuple(self._pending))
+        self._ops_since_checkpoint += len(self._pending)
+        self._pending = []
+        if self._ops_since_checkpoint >= max(self.checkpoint_interval, self._size):
+            self._checkpoint()
+        self._length = len(self._deltas)
+        return True
+
+    def result(self, path):
+        # итог поиска одним шагом: путь и его рёбра; пишется и без промежуточных шагов
+        path = list(path)
+        for i in range(len(path) - 1):
+            Trace._record(self, ADD, "green_edges", (path[i], path[i + 1]))
+        # общее начало с уже записанным путём не переписывается
+        current = self._state[PATH_KEY]
+        common = 0
+        for a, b in zip(current, path):
+            if a != b:
+                break
+            common += 1
+        while len(current) > common:
+            Trace._record(self, POP, PATH_KEY)
+        for node in path[common:]:
+            Trace._record(self, APPEND, PATH_KEY, node)
+        Trace.commit(self)
+
+    def close(self):
+        # запись закончена, последний шаг можно отдавать прямо из текущего состояния
+        self.closed = True
+
+    def _timed_commit(self) -> bool:
+        start = time.perf_counter()
+        res = Trace.commit(self)
+        self.record_time += time.perf_counter() - start
+        return res
+
+    def _checkpoint(self):
+        snapshot = {key: frozenset(self._state[key]) for key in SET_KEYS}
+        snapshot[PATH_KEY] = tuple(self._state[PATH_KEY])
+        # снимок добавляется раньше номера шага: читатель ищет снимок по номеру
+        self._checkpoints.append(snapshot)
+        self._checkpoint_steps.append(len(self._deltas) - 1)
+        self._ops_since_checkpoint = 0
+
+    def _restore(self, i) -> dict:
+        c = bisect_right(self._checkpoint_steps, i) - 1
+        start = self._checkpoint_steps[c]
+        if self._cursor is None or not start <= self._cursor_step <= i:
+            snapshot = self._checkpoints[c]
+            self._cursor = {key: set(snapshot[key]) for key in SET_KEYS}
+            self._cursor[PATH_KEY] = deque(snapshot[PATH_KEY])
+            self._cursor_step = start
+        for step in range(self._cursor_step + 1, i + 1):
+            for op in self._deltas[step]:
+                _apply(self._cursor, op)
+        self._cursor_step = i
+        return self._cursor
+
+    @staticmethod
+    def _export(state) -> dict:
+        res = {key: set(state[key]) for key in SET_KEYS}
+        res[PATH_KEY] = list(state[PATH_KEY])
+        return res
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i) -> dict:
+        length = self._length
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError("trace index out of range")
+        if self.closed and i == length - 1 and not self._pending:
+            return self._export(self._state)
+        return self._export(self._restore(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ResultTrace(Trace):
+    """Трасса без промежуточных шагов: пустое состояние и итог из result()."""
+
+    recording = False
+
+    def _record(self, code, key, item=None):
+        pass
+
+    def clear(self, key):
+        pass
+
+    def commit(self) -> bool:
+        return False
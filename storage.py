@@ -0,0 +1,114 @@
+"""Сохранение графа редактора: номера и центры вершин, ориентированность, рёбра.
+
+Граф хранится как словарь массивов одинакового вида для обоих форматов:
+{"directed": bool, "numbers": [...], "xs": [...], "ys": [...], "edges": [u0, v0, u1, v1, ...]},
+где рёбра заданы индексами вершин в numbers.
+
+.json -- читаемый текстовый формат, остальные расширения -- двоичный: заголовок
+HEADER и массивы int32/float32 подряд. Двоичный файл читается через mmap без
+копирования, массивы отдаются как memoryview.
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b"DMGB"
+HEADER = struct.Struct("<4sIII")  # сигнатура, флаги, число вершин, число рёбер
+DIRECTED = 1
+
+
+def graph_data(directed, numbers, xs, ys, edges) -> dict:
+    return {"directed": bool(directed), "numbers": array("i", numbers), "xs": array("f", xs),
+            "ys": array("f", ys), "edges": array("i", edges)}
+
+
+def _check(data):
+    n = len(data["numbers"])
+    if len(data["xs"]) != n or len(data["ys"]) != n or len(data["edges"]) % 2:
+        raise ValueError("corrupted graph file")
+    if any(not 0 <= v < n for v in data["edges"]):
+        raise ValueError("edge refers to a missing node")
+    if len(set(data["numbers"])) != n or any(number < 1 for number in data["numbers"]):
+        raise ValueError("node numbers must be unique and positive")
+
+
+def save_json(path, data):
+    nodes = [[number, x, y] for number, x, y in zip(data["numbers"], data["xs"], data["ys"])]
+    edges = data["edges"]
+    obj = {"directed": data["directed"], "nodes": nodes,
+           "edges": [[edges[i], edges[i + 1]] for i in range(0, len(edges), 2)]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, separators=(",", ":"))
+
+
+def load_json(path) -> dict:
+    with open(path, encoding="utf-8") as f:
+        obj = json.load(f)
+    try:
+        nodes = obj.get("nodes", [])
+        data = graph_data(obj.get("directed", False), (node[0] for node in nodes), (node[1] for node in nodes),
+                          (node[2] for node in nodes), (v for edge in obj.get("edges", []) for v in edge))
+    except (AttributeError, IndexError, OverflowError, TypeError):
+        raise ValueError("corrupted graph file")
+    _check(data)
+    return data
+
+
+def _little_endian(a) -> array:
+    if sys.byteorder == "little":
+        return a
+    a = array(a.typecode, a)
+    a.byteswap()
+    return a
+
+
+def save_binary(path, data):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, DIRECTED if data["directed"] else 0, len(data["numbers"]),
+                            len(data["edges"]) // 2))
+        for key, typecode in (("numbers", "i"), ("xs", "f"), ("ys", "f"), ("edges", "i")):
+            _little_endian(array(typecode, data[key])).tofile(f)
+
+
+def load_binary(path) -> dict:
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        if size < HEADER.size:
+            raise ValueError("not a graph file")
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, flags, n, m = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("not a graph file")
+    if size != HEADER.size + 4 * (3 * n + 2 * m):
+        raise ValueError("corrupted graph file")
+    view = memoryview(buf)
+    data = {"directed": bool(flags & DIRECTED)}
+    offset = HEADER.size
+    for key, typecode, count in (("numbers", "i", n), ("xs", "f", n), ("ys", "f", n), ("edges", "i", 2 * m)):
+        part = view[offset:offset + 4 * count]
+        # на big-endian машине массив приходится копировать и переворачивать
+        data[key] = part.cast(typecode) if sys.byteorder == "little" else _swapped(part, typecode)
+        offset += 4 * count
+    _check(data)
+    return data
+
+
+def _swapped(part, typecode) -> array:
+    a = array(typecode, bytes(part))
+    a.byteswap()
+    return a
+
+
+def save(path, data):
+    if path.endswith(".json"):
+        save_json(path, data)
+    else:
+        save_binary(path, data)
+
+
+def load(path) -> dict:
+    if path.endswith(".json"):
+        return load_json(path)
+    return load_binary(path)
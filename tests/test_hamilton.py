@@ -0,0 +1,157 @@
+"""Решатели гамильтоновых путей и циклов против полного перебора перестановок.
+
+Случайные графы до MAX_ORACLE_NODES вершин, ориентированные и нет. Переборы
+_path_dfs и _cycle_dfs вызываются и напрямую, в обход hamilton_obstacle, чтобы
+отсечение hopeless() проверялось и на графах без пути.
+"""
+import itertools
+import random
+
+import pytest
+
+import analysis
+import hamilton
+from graph import Graph
+from progress import Progress
+from states import ResultTrace, Trace
+
+MAX_ORACLE_NODES = 7
+GRAPHS = 150
+
+
+def random_graph(rnd, n, directed) -> Graph:
+    graph = Graph(directed)
+    for v in range(n):
+        graph.add_node(str(v))
+    density = rnd.choice((0.2, 0.35, 0.5, 0.7))
+    for u, v in itertools.permutations(range(n), 2):
+        if (directed or u < v) and rnd.random() < density:
+            graph.add_edge(str(u), str(v), directed)
+    return graph
+
+
+def graphs(directed, seed):
+    rnd = random.Random(seed)
+    for _ in range(GRAPHS):
+        yield random_graph(rnd, rnd.randint(1, MAX_ORACLE_NODES), directed)
+
+
+def arcs(core) -> set:
+    return {(core.labels[u], core.labels[v]) for u in range(len(core)) for v in core.neighbours(u)}
+
+
+def oracle(core, cycle) -> int:
+    """Число гамильтоновых путей (циклов) в тех же соглашениях, что count_all."""
+    labels = core.labels
+    n = len(labels)
+    edges = arcs(core)
+    total = 0
+    for order in itertools.permutations(labels):
+        if cycle and order[0] != labels[0]:
+            continue
+        if all(pair in edges for pair in zip(order, order[1:])) and (not cycle or (order[-1], order[0]) in edges):
+            total += 1
+    if core.directed or n < 2 or cycle and n == 2:
+        return total
+    # в неориентированном графе путь и его разворот, цикл и его обратный обход -- одно
+    return total // 2
+
+
+def assert_hamiltonian(core, path, cycle):
+    labels = core.labels
+    edges = arcs(core)
+    if cycle:
+        assert path[0] == path[-1]
+        path = path[:-1]
+    assert sorted(path) == sorted(labels)
+    steps = list(zip(path, path[1:])) + ([(path[-1], path[0])] if cycle else [])
+    assert all(step in edges for step in steps)
+
+
+def found(trace) -> list:
+    return list(trace[-1]["green_nodes"]) if trace else []
+
+
+@pytest.mark.parametrize("directed", (False, True))
+@pytest.mark.parametrize("trace_type", (ResultTrace, Trace))
+def test_solvers_match_oracle(directed, trace_type):
+    for graph in graphs(directed, 1):
+        core = graph.core
+        for cycle, solve in ((False, graph.hamilton_path), (True, graph.hamilton_cycle)):
+            path = found(solve(trace=trace_type()))
+            expected = oracle(core, cycle) if len(core) >= (2 if cycle else 1) else 0
+            assert bool(path) == bool(expected)
+            if path:
+                assert_hamiltonian(core, path, cycle)
+
+
+@pytest.mark.parametrize("directed", (False, True))
+def test_searches_without_obstacle_check(directed):
+    for graph in graphs(directed, 2):
+        core = graph.core
+        # одну вершину hamilton_path и hamilton_cycle до перебора не доводят
+        if len(core) < 2:
+            continue
+        for cycle, search in ((False, hamilton._path_dfs), (True, hamilton._cycle_dp), (True, hamilton._cycle_dfs)):
+            path = found(search(core, ResultTrace(), Progress()))
+            assert bool(path) == bool(oracle(core, cycle))
+            if path:
+                assert_hamiltonian(core, path, cycle)
+
+
+@pytest.mark.parametrize("directed", (False, True))
+def test_counting_matches_oracle(directed):
+    for graph in graphs(directed, 3):
+        core = graph.core
+        paths, cycles = oracle(core, False), oracle(core, True)
+        assert hamilton.count_paths(core, Progress()) == paths
+        assert hamilton.count_cycles(core, Progress()) == cycles
+        assert graph.count_hamilton_paths() == paths
+        assert graph.count_hamilton_cycles() == cycles
+        assert len(list(graph.all_hamilton_paths())) == paths
+        assert len(list(graph.all_hamilton_cycles())) == cycles
+
+
+@pytest.mark.parametrize("directed", (False, True))
+def test_obstacle_rejects_only_graphs_without_path(directed):
+    rejected = 0
+    for graph in graphs(directed, 4):
+        core = graph.core
+        for cycle in (False, True):
+            if analysis.hamilton_obstacle(core, cycle) is not None:
+                rejected += 1
+                assert oracle(core, cycle) == 0
+    # проверка не пустая: случайные графы часто отсекаются без поиска
+    assert rejected > GRAPHS // 2
+
+
+def hidden_path_graph(n, seed) -> Graph:
+    # случайная перестановка вершин -- гамильтонов путь, поверх него лишние дуги
+    rnd = random.Random(seed)
+    order = list(range(n))
+    rnd.shuffle(order)
+    graph = Graph(True)
+    for v in range(n):
+        graph.add_node(str(v))
+    for u, v in zip(order, order[1:]):
+        graph.add_edge(str(u), str(v), True)
+    for _ in range(2 * n):
+        u, v = rnd.sample(range(n), 2)
+        graph.add_edge(str(u), str(v), True)
+    return graph
+
+
+@pytest.mark.parametrize("n", (hamilton.MAX_DP_NODES, hamilton.MAX_DP_NODES + 1))
+def test_path_on_both_sides_of_dp_cutoff(n, monkeypatch):
+    calls = []
+    path_dfs = hamilton._path_dfs
+
+    def spy(*args):
+        calls.append(args)
+        return path_dfs(*args)
+
+    monkeypatch.setattr(hamilton, "_path_dfs", spy)
+    graph = hidden_path_graph(n, n)
+    path = found(graph.hamilton_path(trace=ResultTrace()))
+    assert bool(calls) == (n > hamilton.MAX_DP_NODES)
+    assert_hamiltonian(graph.core, path, False)
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from progress import Cancelled, Progress
+
+
+class AlgorithmWorker:
+    """Запускает решатель в фоновом потоке, чтобы не останавливать цикл pygame.
+
+    target вызывается как target(progress) и должен периодически вызывать
+    progress.advance(), тогда cancel() прерывает поиск.
+    """
+
+    def __init__(self, target, name=""):
+        self.target = target
+        self.name = name
+        self.progress = Progress()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.start_time = None
+        self.elapsed = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self.result = self.target(self.progress)
+        except Cancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        self.elapsed = time.perf_counter() - self.start_time
+
+    def cancel(self):
+        self.progress.cancel()
+
+    @property
+    def done(self) -> bool:
+        return not self._thread.is_alive() and self.elapsed is not None